@@ -7,7 +7,8 @@ def create_app(config_name="default"):
     app = Flask(__name__, template_folder='templates') 
     
     with app.app_context():
-        from . import view
+        from . import view, api
         app.register_blueprint(view.main_bp)
+        app.register_blueprint(api.api_bp)
     
     return app  
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import orjson
+from flask import Blueprint, Response, request
+from services import orchestrator, profiling, generation_service, answer_cache
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+BATCH_MAX_QUERIES = int(os.getenv("API_BATCH_MAX_QUERIES", 32))
+SOURCE_FIELDS = ['title', 'date', 'url', 'image_url', 'source_type', 'score']
+
+
+def _json_response(payload, status=200):
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def _error(message, status=400):
+    return _json_response({'error': message}, status=status)
+
+def _serialize_result(query, result, include_content=False, explain=False):
+    fields = SOURCE_FIELDS + ['content'] if include_content else SOURCE_FIELDS
+    if explain:
+        fields = fields + ['explain_score']
+    return {
+        'query': query,
+        'answer': result['answer'],
+        'sources': [{field: source.get(field) for field in fields} for source in result['sources']],
+        'gallery': result['gallery'],
+        'meta': result.get('meta', {}),
+    }
+
+def _source():
+    return 'replay' if request.headers.get('X-Replay') == '1' else 'api'
+
+def _read_body():
+    try:
+        return orjson.loads(request.get_data()) or {}
+    except orjson.JSONDecodeError:
+        return None
+
+@api_bp.route('/query', methods=['POST'])
+def query():
+    body = _read_body()
+    if not isinstance(body, dict):
+        return _error("Request body must be a JSON object.")
+
+    user_query = body.get('query')
+    if not isinstance(user_query, str) or not user_query.strip():
+        return _error("Field 'query' must be a non-empty string.")
+
+    if profiling.should_profile(request.headers, request.args, request.remote_addr):
+        request_id = profiling.request_id(request.headers)
+        result = profiling.profile_call(request_id, orchestrator.run_query, user_query, source=_source())
+        payload = _serialize_result(user_query, result, bool(body.get('include_content')), bool(body.get('explain')))
+        payload['profile_id'] = request_id
+        return _json_response(payload)
+
+    result = orchestrator.run_query(user_query, source=_source())
+    return _json_response(_serialize_result(user_query, result, bool(body.get('include_content')), bool(body.get('explain'))))
+
+@api_bp.route('/batch', methods=['POST'])
+def batch():
+    body = _read_body()
+    if not isinstance(body, dict):
+        return _error("Request body must be a JSON object.")
+
+    queries = body.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return _error("Field 'queries' must be a non-empty list of strings.")
+    if not all(isinstance(q, str) and q.strip() for q in queries):
+        return _error("Every entry in 'queries' must be a non-empty string.")
+    if len(queries) > BATCH_MAX_QUERIES:
+        return _error(f"At most {BATCH_MAX_QUERIES} queries are allowed per batch.")
+
+    include_content = bool(body.get('include_content'))
+    explain = bool(body.get('explain'))
+    results = orchestrator.run_batch(queries)
+    return _json_response({
+        'results': [_serialize_result(q, r, include_content, explain) for q, r in zip(queries, results)]
+    })
+
+@api_bp.route('/stats', methods=['GET'])
+def stats():
+    return _json_response({
+        'coalesced_requests': orchestrator.get_coalesced_count(),
+        'generation': generation_service.backend.stats(),
+        'warm_window': answer_cache.warm_stats(orchestrator.CORPUS_EPOCH),
+    })
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, request
-from services import orchestrator, retrieval_service
+from services import orchestrator, retrieval_service, profiling
 
 main_bp = Blueprint('main', __name__)
 
@@ -14,7 +14,13 @@ def main():
         user_query = request.form.get('query')
 
         if user_query:
-            answer, text_sources, image_sources = orchestrator.get_rag_response(user_query)
+            if profiling.should_profile(request.headers, request.args, request.remote_addr):
+                request_id = profiling.request_id(request.headers)
+                answer, text_sources, image_sources = profiling.profile_call(
+                    request_id, orchestrator.get_rag_response, user_query
+                )
+            else:
+                answer, text_sources, image_sources = orchestrator.get_rag_response(user_query)
 
     return render_template(
         "base.html", 
@@ -0,0 +1,27 @@
+import gc
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", 2))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.getenv("WEB_TIMEOUT", 180))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from services import retrieval_service, generation_service, orchestrator
+
+    retrieval_service.connect()
+    generation_service.configure()
+    orchestrator.start_corpus_refresher()
+
+
+def worker_exit(server, worker):
+    from services import retrieval_service
+
+    retrieval_service.close_connection()
@@ -0,0 +1,110 @@
+import os
+import sys
+import random
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["BATCH_RAG_DEFER_CONNECT"] = "1"
+
+from services import orchestrator, retrieval_service
+
+TEXT_HITS = orchestrator.TEXT_ARTICLE_LIMIT
+IMAGE_HITS = 5
+TITLES_PER_IMAGE = 3
+
+
+def build_store(num_articles, article_chars):
+    paragraph = "Researchers reported results on a new benchmark for multimodal models. " * 20
+    body = (paragraph * (article_chars // len(paragraph) + 1))[:article_chars]
+    return {
+        f"Article {i}": {'news_id': i, 'content': f"{i} {body}", 'date': f"2024-{i % 12 + 1:02d}-01", 'url': None,
+                         'digest': body[:900]}
+        for i in range(num_articles)
+    }
+
+
+def fake_responses(store, requests, seed, missing_ratio, chunk_chars):
+    # Search responses are built up front so only candidate construction is measured.
+    rng = random.Random(seed)
+    titles = list(store)
+    responses = []
+    for _ in range(requests):
+        groups = []
+        for title in rng.sample(titles, TEXT_HITS):
+            if rng.random() < missing_ratio:
+                title = f"{title} (not in store)"
+            chunks = [{'content': f"{title} " + "x" * chunk_chars, 'issue_date': "2024-01-01", 'news_title': title}
+                      for _ in range(orchestrator.CHUNKS_PER_ARTICLE)]
+            groups.append({'news_title': title, 'chunks': chunks, 'score': rng.random()})
+        images = [{'image_url': f"https://example.com/{n}.png", 'news_title': None, 'score': rng.random(),
+                   'news_titles': rng.sample(titles, TITLES_PER_IMAGE), 'issue_urls': [None] * TITLES_PER_IMAGE}
+                  for n in range(IMAGE_HITS)]
+        responses.append((groups, images))
+
+    pending = iter(responses)
+    current = {}
+
+    def search_articles(query, **kwargs):
+        current['groups'], current['images'] = next(pending)
+        return current['groups']
+
+    retrieval_service.search_articles = search_articles
+    retrieval_service.search_images_by_text = lambda query, **kwargs: current['images']
+
+
+def eager_candidates(query):
+    # The previous behaviour: every hit is turned into a full candidate before ranking discards most of them.
+    articles_db = orchestrator.ARTICLES_DB
+    refs, gallery, fallback_chunks = orchestrator._candidate_refs(query, None, None, {}, {}, articles_db)
+    candidates = orchestrator.hydrate_candidates(refs, articles_db, fallback_chunks)
+    return orchestrator.rank_candidates(candidates), gallery[:4]
+
+
+def lazy_candidates(query):
+    return orchestrator.retrieve_candidates(query, date_range={})
+
+
+def measure(fn, requests, seed, store, args):
+    fake_responses(store, requests, seed, args.missing, args.chunk_chars)
+    peaks, retained = [], []
+    tracemalloc.start()
+    for n in range(requests):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = fn(f"query {n}")
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+        retained.append(current - base)
+        del result
+    tracemalloc.stop()
+    return sum(peaks) / requests, sum(retained) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request allocations with eager vs lazy candidate hydration.")
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--article-chars", type=int, default=200_000)
+    parser.add_argument("--chunk-chars", type=int, default=2_000)
+    parser.add_argument("--missing", type=float, default=0.25, help="Share of text hits not in the article store")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    store = build_store(args.articles, args.article_chars)
+    orchestrator.ARTICLES_DB = store
+    orchestrator.print = lambda *a, **k: None
+
+    print(f"{args.articles} articles of {args.article_chars / 1000:.0f}k chars, {TEXT_HITS} text hits + "
+          f"{IMAGE_HITS}x{TITLES_PER_IMAGE} image titles per request, {args.missing:.0%} of text hits outside the store")
+    results = {name: measure(fn, args.requests, 0, store, args)
+               for name, fn in [("eager", eager_candidates), ("lazy", lazy_candidates)]}
+
+    print(f"\n{'hydration':<10}{'peak KiB/request':>18}{'result KiB/request':>20}")
+    for name, (peak, retained) in results.items():
+        print(f"{name:<10}{peak / 1024:>18.1f}{retained / 1024:>20.1f}")
+    (eager_peak, _), (lazy_peak, _) = results["eager"], results["lazy"]
+    print(f"\nPeak allocation per request reduced by {(1 - lazy_peak / eager_peak) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
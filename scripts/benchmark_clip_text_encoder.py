@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.evaluation_data import test_questions
+
+MIN_COSINE = 0.98
+EXTRA_QUERIES = [
+    "a robot arm in a factory",
+    "GPU data center",
+    "chatbot on a smartphone screen",
+    "self-driving car on a city street",
+    "medical imaging with AI",
+    "protein structure prediction",
+]
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_encoder(variant, path):
+    import clip
+    from services import clip_text_encoder
+
+    if variant == "quantized":
+        return clip_text_encoder.load_text_encoder(path)
+
+    clip_text_encoder.configure_threads()
+    model, _ = clip.load(clip_text_encoder.CLIP_MODEL_NAME, device="cpu", jit=False)
+    return model.float().eval()
+
+
+def measure(variant, path, queries, repeats):
+    import torch
+    import clip
+
+    rss_before = _rss_mb()
+    encoder = _load_encoder(variant, path)
+    rss_loaded = _rss_mb()
+
+    tokens = clip.tokenize(queries, truncate=True)
+    with torch.no_grad():
+        vectors = encoder.encode_text(tokens).float().numpy()
+
+        single_latencies = []
+        for _ in range(repeats):
+            for i in range(len(queries)):
+                start = time.perf_counter()
+                encoder.encode_text(tokens[i:i + 1])
+                single_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            encoder.encode_text(tokens)
+        batch_latency = (time.perf_counter() - start) / repeats
+
+    return {
+        "variant": variant,
+        "threads": torch.get_num_threads(),
+        "rss_model_mb": rss_loaded - rss_before,
+        "rss_total_mb": _rss_mb(),
+        "p50_ms": float(np.percentile(single_latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(single_latencies, 95) * 1000),
+        "batch_ms": batch_latency * 1000,
+        "vectors": vectors.tolist(),
+    }
+
+
+def _run_child(variant, path, repeats):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", variant, "--path", path, "--repeats", str(repeats)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _cosines(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def main():
+    from services.clip_text_encoder import DEFAULT_EXPORT_PATH
+
+    parser = argparse.ArgumentParser(description="Parity check and CPU benchmark of the int8 CLIP text encoder.")
+    parser.add_argument("--path", default=os.getenv("CLIP_TEXT_ENCODER_PATH", DEFAULT_EXPORT_PATH))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", choices=["reference", "quantized"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    queries = list(test_questions) + EXTRA_QUERIES
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.path, queries, args.repeats)))
+        return
+
+    if not os.path.exists(args.path):
+        print(f"Exported encoder not found at {args.path}. Run 'python scripts/export_clip_text_encoder.py' first.")
+        sys.exit(1)
+
+    reference = _run_child("reference", args.path, args.repeats)
+    quantized = _run_child("quantized", args.path, args.repeats)
+
+    cosines = _cosines(reference["vectors"], quantized["vectors"])
+    print(f"\n{'variant':<12}{'threads':>8}{'model RSS MB':>14}{'total RSS MB':>14}{'p50 ms':>9}{'p95 ms':>9}{'batch ms':>10}")
+    for row in (reference, quantized):
+        print(f"{row['variant']:<12}{row['threads']:>8}{row['rss_model_mb']:>14.1f}{row['rss_total_mb']:>14.1f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['batch_ms']:>10.2f}")
+
+    print(f"\nCosine agreement with reference over {len(queries)} queries: "
+          f"min {cosines.min():.4f}, mean {cosines.mean():.4f}")
+
+    if cosines.min() < MIN_COSINE:
+        print(f"PARITY FAILED: minimum cosine {cosines.min():.4f} < {MIN_COSINE}")
+        sys.exit(1)
+    print("Parity OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import digest
+from services.corpus import ARTICLES_PATH
+
+CANDIDATES_PER_PROMPT = 6
+CHARS_PER_TOKEN = 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt size with full article text vs extractive digests.")
+    parser.add_argument("--articles", default=ARTICLES_PATH)
+    parser.add_argument("--top-n", type=int, default=int(os.getenv("GEN_FULL_TEXT_TOP_N", 2)))
+    parser.add_argument("--prompts", type=int, default=500)
+    parser.add_argument("--show", type=int, default=2, help="Print this many sample digests")
+    args = parser.parse_args()
+
+    with open(args.articles, "r", encoding="utf-8") as f:
+        articles = json.load(f)
+
+    start = time.perf_counter()
+    digests = digest.build_digests(articles)
+    elapsed = time.perf_counter() - start
+    print(f"Built {len(digests)} digests for {len(articles)} articles in {elapsed:.2f}s "
+          f"({elapsed / max(len(articles), 1) * 1000:.1f} ms/article, CPU only)")
+
+    full = {a['title']: "\n\n".join(a.get('chunks', []))[:6000] for a in articles if a.get('title') in digests}
+    titles = list(full)
+    if len(titles) < CANDIDATES_PER_PROMPT:
+        sys.exit("Not enough articles with digests to simulate prompts.")
+
+    avg_full = sum(len(t) for t in full.values()) / len(full)
+    avg_digest = sum(len(digests[t]) for t in titles) / len(titles)
+    print(f"Average article context: {avg_full:.0f} chars full text vs {avg_digest:.0f} chars digest")
+
+    random.seed(0)
+    before, after = 0, 0
+    for _ in range(args.prompts):
+        sample = random.sample(titles, CANDIDATES_PER_PROMPT)
+        before += sum(len(full[t]) for t in sample)
+        after += sum(len(full[t]) if rank < args.top_n else len(digests[t]) for rank, t in enumerate(sample))
+
+    before /= args.prompts
+    after /= args.prompts
+    print(f"Article context per prompt ({CANDIDATES_PER_PROMPT} candidates, top {args.top_n} in full): "
+          f"{before:.0f} -> {after:.0f} chars (~{before / CHARS_PER_TOKEN:.0f} -> ~{after / CHARS_PER_TOKEN:.0f} tokens, "
+          f"{(1 - after / before) * 100:.0f}% smaller)")
+
+    for title in titles[:args.show]:
+        print(f"\n[{title}]\n{digests[title]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import gc
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_QUERIES = ["robots in a factory", "new open-weights language model", "GPU data center"]
+
+
+def unique_rss_mb(pid):
+    private = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                private += int(line.split()[1])
+    return private / 1024
+
+
+def load_assets():
+    from services import orchestrator
+    return orchestrator
+
+
+def serve_like_worker(orchestrator):
+    orchestrator.retrieval_service.encode_clip_texts(SAMPLE_QUERIES)
+    for title, entry in list(orchestrator.ARTICLES_DB.items())[:50]:
+        len(entry['content'])
+
+
+def run_mode(mode, workers):
+    os.environ["BATCH_RAG_DEFER_CONNECT"] = "1"
+    orchestrator = None
+    if mode == "preload":
+        orchestrator = load_assets()
+        gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            worker_assets = orchestrator or load_assets()
+            serve_like_worker(worker_assets)
+            os.write(write_fd, b"1")
+            signal.pause()
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    for _, read_fd in children:
+        os.read(read_fd, 1)
+        os.close(read_fd)
+    time.sleep(0.5)
+
+    usage = [unique_rss_mb(pid) for pid, _ in children]
+    for pid, _ in children:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker unique RSS with and without preloading read-only assets.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--mode", choices=["preload", "postfork"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.workers)))
+        return
+
+    results = {}
+    for mode in ("postfork", "preload"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode, "--workers", str(args.workers)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"\nUnique RSS per worker (Private_Clean + Private_Dirty), {args.workers} workers:")
+    for mode, usage in results.items():
+        print(f"  {mode:<9} avg {sum(usage) / len(usage):8.1f} MB   workers: {', '.join(f'{u:.1f}' for u in usage)}")
+
+    postfork_avg = sum(results["postfork"]) / len(results["postfork"])
+    preload_avg = sum(results["preload"]) / len(results["preload"])
+    print(f"\nPreloading saves {postfork_avg - preload_avg:.1f} MB per worker "
+          f"({(1 - preload_avg / postfork_avg) * 100:.0f}%).")
+
+    if preload_avg >= postfork_avg:
+        print("FAILED: preloading did not reduce per-worker unique RSS.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
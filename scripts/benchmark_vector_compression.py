@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.local_index import LocalVectorIndex
+
+LOCAL_VARIANTS = [
+    ("float32", None),
+    ("float16", None),
+    ("float16", 50),
+    ("int8", None),
+    ("int8", 50),
+]
+
+
+def load_weaviate_vectors(collection_name):
+    import weaviate
+    from weaviate.connect import ConnectionParams
+
+    client = weaviate.WeaviateClient(
+        connection_params=ConnectionParams.from_params(
+            http_host="localhost",
+            http_port=8080,
+            http_secure=False,
+            grpc_host="localhost",
+            grpc_port=50051,
+            grpc_secure=False,
+        )
+    )
+    client.connect()
+    collection = client.collections.get(collection_name)
+
+    uuids, vectors = [], []
+    for obj in collection.iterator(include_vector=True):
+        vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+        if vector:
+            uuids.append(str(obj.uuid))
+            vectors.append(vector)
+
+    print(f"Loaded {len(vectors)} vectors from '{collection_name}'.")
+    return client, collection, uuids, np.asarray(vectors, dtype=np.float32)
+
+
+def make_queries(vectors, count, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+    queries = vectors[picks] / np.linalg.norm(vectors[picks], axis=1, keepdims=True)
+    queries = queries + rng.normal(0, noise, size=queries.shape).astype(np.float32)
+    return queries.astype(np.float32)
+
+
+def exact_top_k(vectors, queries, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ normalized.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def recall_at_k(results, truth):
+    return float(np.mean([len(set(r) & t) / len(t) for r, t in zip(results, truth)]))
+
+
+def summarize(name, memory_bytes, latencies, recall, baseline_bytes):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "variant": name,
+        "memory_mb": memory_bytes / 1e6,
+        "memory_ratio": memory_bytes / baseline_bytes,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "recall@10": recall,
+    }
+
+
+def benchmark_local(vectors, queries, truth, k):
+    rows = []
+    baseline_bytes = vectors.shape[0] * vectors.shape[1] * 4
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage, shortlist in LOCAL_VARIANTS:
+            rerank_path = os.path.join(tmp_dir, f"{storage}_rerank.npy") if shortlist else None
+            index = LocalVectorIndex(vectors, storage=storage, rerank_path=rerank_path)
+
+            results, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                ids, _ = index.search(query, k=k, shortlist=shortlist)
+                latencies.append(time.perf_counter() - start)
+                results.append(ids)
+
+            name = f"local {storage}" + (f" + rerank@{shortlist}" if shortlist else "")
+            rows.append(summarize(name, index.memory_bytes, latencies, recall_at_k(results, truth), baseline_bytes))
+
+    return rows
+
+
+def _estimated_bytes_per_vector(quantizer, dim):
+    if quantizer is None:
+        return dim * 4
+    kind = type(quantizer).__name__.lower()
+    if "bq" in kind:
+        return dim / 8
+    if "sq" in kind:
+        return dim
+    if "pq" in kind:
+        return getattr(quantizer, "segments", 0) or dim // 4
+    return dim * 4
+
+
+def benchmark_weaviate(collection, uuids, vectors, queries, truth, k):
+    from weaviate.classes.query import MetadataQuery
+
+    quantizer = collection.config.get().vector_index_config.quantizer
+    position = {uuid: i for i, uuid in enumerate(uuids)}
+
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = collection.query.near_vector(
+            near_vector=query.tolist(), limit=k, return_metadata=MetadataQuery(distance=True)
+        )
+        latencies.append(time.perf_counter() - start)
+        results.append([position[str(obj.uuid)] for obj in response.objects if str(obj.uuid) in position])
+
+    dim = vectors.shape[1]
+    memory_bytes = _estimated_bytes_per_vector(quantizer, dim) * len(vectors)
+    name = f"weaviate {type(quantizer).__name__ if quantizer else 'uncompressed'} (estimated memory)"
+    return summarize(name, memory_bytes, latencies, recall_at_k(results, truth), len(vectors) * dim * 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory, latency and recall@10 of compressed vector indexes.")
+    parser.add_argument("--collection", default="BatchImage", help="Weaviate collection to export vectors from")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random vectors instead of Weaviate")
+    parser.add_argument("--dim", type=int, default=512, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02, help="Gaussian noise added to sampled query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    client, collection, uuids = None, None, None
+    if args.synthetic:
+        vectors = np.random.default_rng(1).normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    else:
+        client, collection, uuids, vectors = load_weaviate_vectors(args.collection)
+
+    queries = make_queries(vectors, args.queries, args.noise)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    rows = benchmark_local(vectors, queries, truth, args.k)
+    if collection is not None:
+        rows.append(benchmark_weaviate(collection, uuids, vectors, queries, truth, args.k))
+        client.close()
+
+    print(f"\n{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries")
+    print(f"{'variant':<48}{'memory MB':>11}{'ratio':>8}{'p50 ms':>9}{'p95 ms':>9}{'recall@10':>11}")
+    for row in rows:
+        print(f"{row['variant']:<48}{row['memory_mb']:>11.2f}{row['memory_ratio']:>8.2f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['recall@10']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,24 @@ from bs4 import BeautifulSoup
 import json
 import time
 import os
+import sys
+import argparse
 from datetime import datetime
 from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor
 import re
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.html_archive import HtmlArchive, DEFAULT_ARCHIVE_PATH
+
 class BatchDataCollector:
-    def __init__(self, chunk_size=1000, chunk_overlap=200):
+    def __init__(self, chunk_size=1000, chunk_overlap=200, archive_path=DEFAULT_ARCHIVE_PATH):
         self.base_url = "https://www.deeplearning.ai/the-batch/"
         self.articles = []
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.archive = HtmlArchive(archive_path) if archive_path else None
 
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
@@ -230,50 +237,61 @@ class BatchDataCollector:
     def scrape_article(self, url):
         try:
             response = requests.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
+            # An error page must never replace a good archived copy of the issue.
+            response.raise_for_status()
             issue_id = self._extract_issue_id(url)
+            scraped_at = datetime.now().isoformat()
 
-            date_div = soup.select_one('div.mt-1.text-slate-600.text-base.text-sm')
-            date_string = date_div.get_text().strip() if date_div else "No date found"
-
-            parsed_date = None
-            if date_string != "No date found":
-                parsed_date = self._parse_date(date_string)
-
-            main_title = self._extract_title(soup)
-
-            news_articles = self._extract_news_content(soup)
-
-            total_chunks = sum(len(article['chunks']) for article in news_articles)
-            total_content_length = sum(
-                sum(len(chunk) for chunk in article['chunks'])
-                for article in news_articles
-            )
-
-            return {
-                'url': url,
-                'issue_id': issue_id,
-                'main_title': main_title,
-                'date': parsed_date.isoformat() if parsed_date else None,
-                'date_original': date_string,
-                'news_articles': news_articles,
-                'total_news_count': len(news_articles),
-                'chunk_stats': {
-                    'total_chunks': total_chunks,
-                    'chunk_size_limit': self.chunk_size,
-                    'chunk_overlap': self.chunk_overlap,
-                    'total_content_length': total_content_length,
-                    'avg_chunk_length': total_content_length / total_chunks if total_chunks > 0 else 0,
-                    'avg_chunks_per_article': total_chunks / len(news_articles) if news_articles else 0
-                },
-                'scraped_at': datetime.now().isoformat()
-            }
+            if self.archive is not None and issue_id is not None:
+                self.archive.append(issue_id, url, response.content, fetched_at=scraped_at)
+
+            return self.parse_issue(url, response.content, scraped_at)
 
         except Exception as e:
             print(f"Error scraping {url}: {e}")
             return None
 
+    def parse_issue(self, url, html, scraped_at=None):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        issue_id = self._extract_issue_id(url)
+
+        date_div = soup.select_one('div.mt-1.text-slate-600.text-base.text-sm')
+        date_string = date_div.get_text().strip() if date_div else "No date found"
+
+        parsed_date = None
+        if date_string != "No date found":
+            parsed_date = self._parse_date(date_string)
+
+        main_title = self._extract_title(soup)
+
+        news_articles = self._extract_news_content(soup)
+
+        total_chunks = sum(len(article['chunks']) for article in news_articles)
+        total_content_length = sum(
+            sum(len(chunk) for chunk in article['chunks'])
+            for article in news_articles
+        )
+
+        return {
+            'url': url,
+            'issue_id': issue_id,
+            'main_title': main_title,
+            'date': parsed_date.isoformat() if parsed_date else None,
+            'date_original': date_string,
+            'news_articles': news_articles,
+            'total_news_count': len(news_articles),
+            'chunk_stats': {
+                'total_chunks': total_chunks,
+                'chunk_size_limit': self.chunk_size,
+                'chunk_overlap': self.chunk_overlap,
+                'total_content_length': total_content_length,
+                'avg_chunk_length': total_content_length / total_chunks if total_chunks > 0 else 0,
+                'avg_chunks_per_article': total_chunks / len(news_articles) if news_articles else 0
+            },
+            'scraped_at': scraped_at or datetime.now().isoformat()
+        }
+
     def collect_data(self, max_pages=2):
         print("Getting article links...")
         links = self.get_article_links(max_pages)
@@ -412,13 +430,66 @@ class BatchDataCollector:
         }
 
 
+_worker_collector = None
+
+def _init_reprocess_worker(archive_path, index, chunk_size, chunk_overlap):
+    global _worker_collector
+    _worker_collector = BatchDataCollector(chunk_size, chunk_overlap, archive_path=None)
+    # The parent already loaded the index; reusing it keeps workers from re-reading and re-logging it.
+    _worker_collector.archive = HtmlArchive(archive_path, index=index)
+
+def _reprocess_issue(issue_id):
+    entry = _worker_collector.archive.entry(issue_id)
+    try:
+        return _worker_collector.parse_issue(entry['url'], _worker_collector.archive.read(issue_id), entry['fetched_at'])
+    except Exception as e:
+        print(f"Error reprocessing issue {issue_id}: {e}")
+        return None
+
+def reprocess_archive(archive_path=DEFAULT_ARCHIVE_PATH, chunk_size=1000, chunk_overlap=200, workers=None):
+    collector = BatchDataCollector(chunk_size, chunk_overlap, archive_path=archive_path)
+    issue_ids = collector.archive.issue_ids()
+    if not issue_ids:
+        print(f"No archived pages found in {archive_path}")
+        return None
+
+    workers = workers or os.cpu_count()
+    print(f"Reprocessing {len(issue_ids)} archived issues on {workers} processes "
+          f"(chunk_size={chunk_size}, chunk_overlap={chunk_overlap})")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_reprocess_worker,
+        initargs=(archive_path, collector.archive.index_snapshot(), chunk_size, chunk_overlap),
+    ) as executor:
+        results = executor.map(_reprocess_issue, issue_ids, chunksize=max(1, len(issue_ids) // (workers * 4)))
+        collector.articles = [article for article in results if article]
+
+    print(f"Reprocessed {len(collector.articles)}/{len(issue_ids)} issues in {time.perf_counter() - start:.1f}s")
+    return collector
+
+
 if __name__ == "__main__":
-    collector = BatchDataCollector()
+    parser = argparse.ArgumentParser(description="Scrape The Batch, or re-parse and re-chunk the local HTML archive.")
+    parser.add_argument("command", nargs="?", choices=["collect", "reprocess"], default="collect")
+    parser.add_argument("--max-pages", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Reprocess worker processes (default: all CPU cores)")
+    args = parser.parse_args()
+
+    if args.command == "reprocess":
+        collector = reprocess_archive(args.archive, args.chunk_size, args.chunk_overlap, args.workers)
+        if collector is None:
+            sys.exit(1)
+    else:
+        collector = BatchDataCollector(args.chunk_size, args.chunk_overlap, archive_path=args.archive)
+        collector.collect_data(max_pages=args.max_pages)
 
-    articles = collector.collect_data(max_pages=4)
     collector.save_data()
     collector.save_chunks_only()
     collector.save_news_articles()
 
     stats = collector.get_chunking_stats()
-    print(json.dumps(stats, indent=2))
\ No newline at end of file
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.clip_text_encoder import DEFAULT_EXPORT_PATH, export_text_encoder
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_EXPORT_PATH
+    print("Exporting int8 CLIP text tower (TorchScript)...")
+    export_text_encoder(path)
+    print(f"Saved to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    print("The retriever loads it automatically from CLIP_TEXT_ENCODER_PATH (default: this path).")
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+from types import SimpleNamespace
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SOURCE_ARTICLES_PATH = "data/processed/news_articles.json"
+NEW_TITLE = "Hot Reload Test: A New Issue Arrives"
+NEW_CHUNKS = [
+    "A newly indexed article whose full text must reach running workers without a restart.",
+    "Its second chunk is only visible once the article store has been swapped.",
+]
+
+WORK_DIR = tempfile.mkdtemp(prefix="batch_rag_hot_reload_")
+os.environ["BATCH_RAG_DEFER_CONNECT"] = "1"
+os.environ.setdefault("EMBEDDING_SIDECAR_SOCKET", os.path.join(WORK_DIR, "sidecar.sock"))
+os.environ["ARTICLES_DB_PATH"] = os.path.join(WORK_DIR, "news_articles.json")
+os.environ["INDEX_GENERATION_PATH"] = os.path.join(WORK_DIR, "index_generation.json")
+
+
+def seed_corpus():
+    if os.path.exists(SOURCE_ARTICLES_PATH):
+        shutil.copy(SOURCE_ARTICLES_PATH, os.environ["ARTICLES_DB_PATH"])
+    else:
+        articles = [{"title": f"Article {i}", "issue_date": "2024-01-01", "chunks": [f"Body of article {i}."]}
+                    for i in range(200)]
+        with open(os.environ["ARTICLES_DB_PATH"], "w", encoding="utf-8") as f:
+            json.dump(articles, f)
+
+
+seed_corpus()
+
+from services import corpus, orchestrator, retrieval_service
+from services.resilience import Deadline
+
+
+class IndexedCorpusQuery:
+    # Stands in for Weaviate after the new issue has been indexed: the new article is always the top hit.
+    def hybrid(self, query, group_by=None, **kwargs):
+        time.sleep(0.005)
+        if group_by is None:
+            return SimpleNamespace(objects=[])
+        chunk = SimpleNamespace(
+            properties={"news_title": NEW_TITLE, "content": NEW_CHUNKS[0], "issue_date": "2030-01-01"},
+            metadata=SimpleNamespace(score=1.0, explain_score=""),
+        )
+        return SimpleNamespace(groups={NEW_TITLE: SimpleNamespace(objects=[chunk])}, objects=[])
+
+
+class FakeEncoder:
+    def encode_texts(self, texts):
+        return np.random.rand(len(texts), 512).astype(np.float32)
+
+
+def add_issue():
+    path = os.environ["ARTICLES_DB_PATH"]
+    with open(path, "r", encoding="utf-8") as f:
+        articles = json.load(f)
+    articles.append({"title": NEW_TITLE, "issue_date": "2030-01-01", "chunks": NEW_CHUNKS})
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(articles, f)
+    os.replace(tmp_path, path)
+    return corpus.write_generation_marker(articles=len(articles))
+
+
+def worker(stop, records, lock):
+    while not stop.is_set():
+        epoch = orchestrator.CORPUS_EPOCH
+        start = time.monotonic()
+        try:
+            candidates, _ = orchestrator.retrieve_candidates("new issue", deadline=Deadline(2.0))
+            error = None
+        except Exception as e:
+            candidates, error = [], repr(e)
+        end = time.monotonic()
+
+        new_article = next((c for c in candidates if c['title'] == NEW_TITLE), None)
+        full_text = bool(new_article) and NEW_CHUNKS[1] in new_article['content']
+        with lock:
+            records.append((start, end - start, epoch, full_text, error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add an issue while a load test runs and check that workers pick it up without a restart.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=6.0)
+    parser.add_argument("--add-after", type=float, default=2.0)
+    parser.add_argument("--refresh", type=float, default=0.5, help="Refresher poll interval in seconds")
+    args = parser.parse_args()
+
+    retrieval_service.clip_encoder = FakeEncoder()
+    retrieval_service.text_collection = SimpleNamespace(query=IndexedCorpusQuery())
+    retrieval_service.image_collection = SimpleNamespace(query=IndexedCorpusQuery())
+    orchestrator._refresher.interval = args.refresh
+    orchestrator.start_corpus_refresher()
+    initial_epoch = orchestrator.CORPUS_EPOCH
+
+    stop, lock, records = threading.Event(), threading.Lock(), []
+    threads = [threading.Thread(target=worker, args=(stop, records, lock)) for _ in range(args.threads)]
+    load_start = time.monotonic()
+    for t in threads:
+        t.start()
+
+    time.sleep(args.add_after)
+    added_at = time.monotonic()
+    marker = add_issue()
+    print(f"Added '{NEW_TITLE}' (index generation {marker['generation']}) after {added_at - load_start:.1f}s of load")
+
+    time.sleep(max(0.0, args.duration - args.add_after))
+    stop.set()
+    for t in threads:
+        t.join()
+    orchestrator._refresher.stop()
+
+    errors = [r for r in records if r[4]]
+    latencies = np.array([r[1] for r in records])
+    visible = [r for r in records if r[3]]
+    first_visible = min(r[0] + r[1] for r in visible) - added_at if visible else None
+    stale_after_swap = [r for r in records if visible and r[0] > min(v[0] + v[1] for v in visible) and not r[3]]
+    mismatched = [r for r in records if r[2] != initial_epoch and not r[3]]
+
+    print(f"\n{len(records)} requests on {args.threads} threads, {len(errors)} errors")
+    print(f"Latency p50={np.percentile(latencies, 50) * 1000:.1f}ms p95={np.percentile(latencies, 95) * 1000:.1f}ms "
+          f"max={latencies.max() * 1000:.1f}ms")
+    print(f"Epoch {initial_epoch} -> {orchestrator.CORPUS_EPOCH}")
+    if first_visible is not None:
+        print(f"Full text of the new article visible {first_visible:.2f}s after it was added")
+
+    failures = []
+    if errors:
+        failures.append(f"{len(errors)} requests failed, e.g. {errors[0][4]}")
+    if first_visible is None:
+        failures.append("the new article never reached the running process")
+    elif first_visible > args.refresh * 2 + 1.0:
+        failures.append(f"the new article took {first_visible:.2f}s to appear")
+    if orchestrator.CORPUS_EPOCH == initial_epoch:
+        failures.append("the cache epoch did not change")
+    if stale_after_swap:
+        failures.append(f"{len(stale_after_swap)} requests read the old store after the swap")
+    if mismatched:
+        failures.append(f"{len(mismatched)} requests keyed by the new epoch read the old store")
+
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK: the new issue was picked up under load without errors or a restart.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ import os
 import sys
 import json
 import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from dotenv import load_dotenv
 
@@ -9,8 +12,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv(override=True)
 
 try:
-    from services import orchestrator
+    from services import orchestrator, generation_service
     from services.generation_service import gemini_model 
+    from services.rate_limit import RateLimiter
+    from google.api_core import exceptions as google_exceptions
     from scripts.evaluation_data import test_questions, ground_truths 
 except ImportError as e:
     print(f"Import error: {e}")
@@ -22,6 +27,87 @@ except Exception as e:
     sys.exit(1)
 
 
+JUDGE_PROMPT_VERSION = "judge-v1"
+CACHE_PATH = "data/eval/eval_cache.json"
+CHECKPOINT_PATH = "data/eval/checkpoint.json"
+RESULTS_PATH = "evaluation_results_custom.csv"
+MAX_WORKERS = int(os.getenv("EVAL_CONCURRENCY", 4))
+REQUESTS_PER_MINUTE = float(os.getenv("EVAL_RPM", 15))
+METRICS = ["faithfulness", "answer_relevancy", "context_precision", "ground_truth_similarity"]
+
+
+_stats_lock = threading.Lock()
+
+
+def _count(stats, key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def _hash_key(*parts):
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class EvalCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"rag": {}, "judge": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data.update(json.load(f))
+            except Exception as e:
+                print(f"Could not read eval cache {path}: {e}")
+
+    def get(self, section, key):
+        with self._lock:
+            return self.data[section].get(key)
+
+    def put(self, section, key, value):
+        with self._lock:
+            self.data[section][key] = value
+
+    def save(self):
+        with self._lock:
+            _write_json_atomic(self.path, self.data)
+
+
+def _run_fingerprint():
+    # A checkpoint only resumes a run with the same prompts, corpus and candidate settings.
+    return {
+        "prompt_version": generation_service.PROMPT_VERSION,
+        "judge_prompt_version": JUDGE_PROMPT_VERSION,
+        "corpus_epoch": orchestrator.CORPUS_EPOCH,
+        "adaptive_cutoff": orchestrator.ADAPTIVE_CUTOFF,
+        "max_candidates": orchestrator.MAX_CANDIDATES,
+    }
+
+
+def load_checkpoint(path, fingerprint):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except Exception as e:
+        print(f"Could not read checkpoint {path}: {e}")
+        return {}
+    if not isinstance(checkpoint, dict) or checkpoint.get("fingerprint") != fingerprint:
+        print("Checkpoint is from a run with different settings; starting over.")
+        return {}
+    return {r["question"]: r for r in checkpoint.get("results", []) if r.get("complete")}
+
+
 def create_judge_prompt(question, generated_answer, context, ground_truth):
     context_str = "\n\n".join(context)
     
@@ -69,68 +155,169 @@ def create_judge_prompt(question, generated_answer, context, ground_truth):
     }}
     """
 
-def run_evaluation():
-    if not gemini_model:
-        print("Gemini model not loaded in generation_service. Exiting.")
-        return
+def _is_failed_answer(answer):
+    return answer.startswith(("Error:", "Gen Error:")) or answer == generation_service.QUOTA_EXCEEDED_MESSAGE
 
-    print("Starting RAG Evaluation (Custom 'Simple Ragas' Mode)...")
-    
-    all_results = []
 
-    questions_to_run = test_questions[:5]
-    truths_to_run = ground_truths[:5]
+def _generate_answer(question, candidates, cache, limiter, stats):
+    # The text the prompt actually carries: digests depend on corpus-wide IDF, so they change with the corpus.
+    retrieved_contexts = generation_service.candidate_contexts(candidates)
+    rag_key = _hash_key(question, retrieved_contexts, generation_service.PROMPT_VERSION, orchestrator.CORPUS_EPOCH)
 
-    for i, question in enumerate(questions_to_run):
-        print(f"\n--- Processing Q {i+1}/{len(questions_to_run)}: {question} ---")
-        
-        answer, text_sources, _ = orchestrator.get_rag_response(question)
-        retrieved_contexts = [s['content'] for s in text_sources]
-        ground_truth = truths_to_run[i][0]
-        
-        print(f"RAG Answer: {answer[:100]}...")
-        print("...waiting 10 seconds (RAG call cooldown)...")
-        time.sleep(10)
-        
-        judge_prompt = create_judge_prompt(question, answer, retrieved_contexts, ground_truth)
-        
-        scores = {} 
-        
+    answer = cache.get("rag", rag_key)
+    if answer is not None:
+        _count(stats, "rag_cache_hits")
+        return answer, retrieved_contexts, None
+
+    if not candidates:
+        return "No articles found.", retrieved_contexts, None
+
+    start = time.perf_counter()
+    try:
+        answer, _ = generation_service.generate_answer_with_ranking(question, candidates, limiter=limiter)
+    except Exception as e:
+        return f"Gen Error: {e}", retrieved_contexts, None
+    generation_seconds = time.perf_counter() - start
+
+    _count(stats, "rag_calls")
+    if not _is_failed_answer(answer):
+        cache.put("rag", rag_key, answer)
+    return answer, retrieved_contexts, generation_seconds
+
+
+def _judge_answer(question, answer, retrieved_contexts, ground_truth, cache, limiter, stats):
+    judge_key = _hash_key(question, retrieved_contexts, answer, ground_truth, JUDGE_PROMPT_VERSION)
+
+    scores = cache.get("judge", judge_key)
+    if scores is not None:
+        _count(stats, "judge_cache_hits")
+        return scores
+
+    max_retries = 3
+    for attempt in range(max_retries):
+        limiter.acquire()
         try:
-            print("Asking Judge (Gemini) to score...")
             response = gemini_model.generate_content(
-                judge_prompt,
+                create_judge_prompt(question, answer, retrieved_contexts, ground_truth),
                 generation_config={"response_mime_type": "application/json"}
             )
             scores_text = response.text.replace("```json", "").replace("```", "") 
             scores = json.loads(scores_text)
-            print(f"Scores: {scores}")
+            _count(stats, "judge_calls")
+            cache.put("judge", judge_key, scores)
+            return scores
+
+        except google_exceptions.ResourceExhausted:
+            wait_time = 20 * (attempt + 1)
+            print(f"Judge quota exceeded (429). Waiting {wait_time} seconds before retrying...")
+            limiter.backoff(wait_time)
 
         except Exception as e:
             print(f"Error during judging: {e}")
-            if "429" in str(e):
-                print("Hit Rate Limit (429). Stopping evaluation.")
-                break 
-        
-        all_results.append({
-            "question": question,
-            "answer": answer,
-            "ground_truth": ground_truth,
-            "faithfulness": scores.get("faithfulness", 0.0),
-            "answer_relevancy": scores.get("answer_relevancy", 0.0),
-            "context_precision": scores.get("context_precision", 0.0),
-            "ground_truth_similarity": scores.get("ground_truth_similarity", 0.0)
-        })
-
-        print("...waiting 10 seconds (Judge call cooldown)...")
-        time.sleep(10)
-
-    df = pd.DataFrame(all_results)
-    df.to_csv("evaluation_results_custom.csv", index=False)
+            return {}
+
+    return {}
+
+
+def evaluate_question(question, ground_truth, cache, limiter, stats):
+    start = time.perf_counter()
+    try:
+        candidates, _ = orchestrator.retrieve_candidates(question)
+    except Exception as e:
+        print(f"Retrieval error for '{question}': {e}")
+        candidates = []
+    retrieval_seconds = time.perf_counter() - start
+
+    answer, retrieved_contexts, generation_seconds = _generate_answer(question, candidates, cache, limiter, stats)
+    scores = {}
+    if not _is_failed_answer(answer):
+        scores = _judge_answer(question, answer, retrieved_contexts, ground_truth, cache, limiter, stats)
+
+    result = {
+        "question": question,
+        "answer": answer,
+        "ground_truth": ground_truth,
+        "num_candidates": len(candidates),
+        "retrieval_ms": retrieval_seconds * 1000,
+        "generation_s": generation_seconds,
+    }
+    for metric in METRICS:
+        result[metric] = scores.get(metric, 0.0)
+    # Failed generations and judge calls score 0; they stay out of the checkpoint so a resumed run retries them.
+    result["complete"] = not _is_failed_answer(answer) and all(metric in scores for metric in METRICS)
+    return result
+
+
+def run_evaluation():
+    if not gemini_model:
+        print("Gemini model not loaded in generation_service. Exiting.")
+        return
+
+    print("Starting RAG Evaluation (Custom 'Simple Ragas' Mode)...")
+    print(f"Concurrency: {MAX_WORKERS} workers, rate limit: {REQUESTS_PER_MINUTE:g} requests/minute")
+    print(f"Candidate cutoff: {'adaptive' if orchestrator.ADAPTIVE_CUTOFF else 'fixed'} "
+          f"(max {orchestrator.MAX_CANDIDATES} candidates)")
+
+    cache = EvalCache(CACHE_PATH)
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    stats = {"rag_calls": 0, "rag_cache_hits": 0, "judge_calls": 0, "judge_cache_hits": 0}
+    results = [None] * len(test_questions)
+    checkpoint_lock = threading.Lock()
+    start_time = time.time()
+
+    fingerprint = _run_fingerprint()
+    completed = load_checkpoint(CHECKPOINT_PATH, fingerprint)
+    pending = []
+    for i, question in enumerate(test_questions):
+        if question in completed:
+            results[i] = completed[question]
+        else:
+            pending.append(i)
+    if len(pending) < len(test_questions):
+        print(f"Resuming from checkpoint: {len(test_questions) - len(pending)} questions already done, {len(pending)} to go")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(evaluate_question, test_questions[i], ground_truths[i][0], cache, limiter, stats): i
+            for i in pending
+        }
+
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print(f"Q {i+1} failed: {e}")
+                continue
+
+            print(f"\n--- Done Q {i+1}/{len(test_questions)}: {test_questions[i]} ---")
+            print(f"RAG Answer: {results[i]['answer'][:100]}...")
+            print(f"Scores: { {m: results[i][m] for m in METRICS} }")
+
+            with checkpoint_lock:
+                cache.save()
+                done = [r for r in results if r and r["complete"]]
+                _write_json_atomic(CHECKPOINT_PATH, {"fingerprint": fingerprint, "results": done})
+
+    df = pd.DataFrame([r for r in results if r])
+    df.to_csv(RESULTS_PATH, index=False)
+    incomplete = sum(1 for r in results if not (r and r["complete"]))
+    if not incomplete and os.path.exists(CHECKPOINT_PATH):
+        # The run is complete; the next run starts fresh (and still reuses the eval cache).
+        os.remove(CHECKPOINT_PATH)
     
     print("\n\n=== EVALUATION COMPLETE ===")
     print(df.drop(columns=['answer', 'ground_truth']))
-    print("\nDetailed results saved to 'evaluation_results_custom.csv'")
+    print(f"\nAPI calls: {stats['rag_calls']} RAG, {stats['judge_calls']} judge "
+          f"(cache hits: {stats['rag_cache_hits']} RAG, {stats['judge_cache_hits']} judge)")
+    print(f"Candidates per question: {df['num_candidates'].mean():.2f} avg, retrieval {df['retrieval_ms'].mean():.0f} ms avg")
+    fresh = df['generation_s'].dropna()
+    if len(fresh):
+        print(f"Generation latency: {fresh.mean():.2f} s avg over {len(fresh)} uncached calls")
+    print(f"Total time: {time.time() - start_time:.1f}s")
+    print(f"\nDetailed results saved to '{RESULTS_PATH}'")
+    if incomplete:
+        print(f"{incomplete} questions failed (scored 0 in this CSV); run again to retry only those.")
 
 if __name__ == "__main__":
     run_evaluation()
\ No newline at end of file
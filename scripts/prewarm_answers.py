@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import answer_cache, corpus
+from services.corpus import ARTICLES_PATH
+from services.digest import split_sentences
+from services.query_log import QUERY_LOG_PATH
+from services.rate_limit import RateLimiter
+
+PREWARM_RPM = float(os.getenv("PREWARM_RPM", 4))
+PREWARM_NICE = int(os.getenv("PREWARM_NICE", 10))
+MAX_ENTITIES = 3
+MAX_LOG_QUERIES = 5
+LOG_QUERY_COVERAGE = 0.6
+
+_WORD = re.compile(r"[A-Za-z0-9][\w'.&-]*[\w&]|[A-Za-z0-9]")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'-]*")
+# Capitalised words that open headlines and sentences without naming anything.
+_NOT_ENTITIES = {
+    "a", "an", "the", "and", "or", "but", "in", "on", "at", "for", "to", "of", "by", "with", "from", "as",
+    "how", "why", "what", "when", "where", "who", "which", "this", "that", "these", "those", "its", "it",
+    "new", "why it matters", "what's new", "how it works", "results", "behind the news", "we're thinking",
+    "yes", "no", "not", "more", "less", "all", "some", "their", "our", "your", "they", "we", "you", "i",
+}
+_STOPWORDS = _NOT_ENTITIES | {"is", "are", "was", "were", "be", "about", "latest", "news", "did", "does", "do"}
+
+
+def normalize(query):
+    return " ".join(query.split()).lower()
+
+
+def _capitalised_runs(text):
+    runs, run = [], []
+    for position, match in enumerate(_WORD.finditer(text)):
+        word = re.sub(r"'s$", "", match.group(0))
+        capitalised = word[0].isupper() or (word[0].isdigit() and any(c.isalpha() for c in word))
+        if capitalised and not (position == 0 and word.lower() in _NOT_ENTITIES):
+            run.append(word)
+            continue
+        if run:
+            runs.append(" ".join(run))
+        run = []
+    if run:
+        runs.append(" ".join(run))
+    return runs
+
+
+def _title_case(title):
+    words = [w for w in _WORD.findall(title) if w.lower() not in _NOT_ENTITIES]
+    return bool(words) and sum(w[0].isupper() for w in words) / len(words) > 0.7
+
+
+def headline_entities(title, lead, limit=MAX_ENTITIES):
+    # Title Case headlines capitalise every word, so names are read from the lead and ranked by title mentions.
+    sources = split_sentences(lead)[:3] + ([] if _title_case(title) else [title])
+    counts = Counter(run for text in sources for run in _capitalised_runs(text))
+    title_lower = title.lower()
+
+    entities = []
+    for entity, count in sorted(counts.items(), key=lambda e: (e[0].lower() in title_lower, e[1]), reverse=True):
+        if entity.lower() in _NOT_ENTITIES or entity.lower() == title_lower:
+            continue
+        # A lone capitalised word only counts if it is not an ordinary word, e.g. "OpenAI" or "GPT-4o".
+        if " " not in entity and entity[1:].islower() and entity.isalpha() and count < 2:
+            continue
+        entities.append(entity)
+        if len(entities) == limit:
+            break
+    return entities
+
+
+def load_past_queries(path):
+    counts = Counter()
+    if not os.path.exists(path):
+        return counts
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("query") and entry.get("source") != "replay":
+                counts[entry["query"]] += 1
+    return counts
+
+
+def similar_past_queries(vocabulary, past_queries, limit=MAX_LOG_QUERIES, coverage=LOG_QUERY_COVERAGE):
+    scored = []
+    for query, frequency in past_queries.items():
+        terms = {t for t in _TOKEN.findall(query) if t not in _STOPWORDS}
+        if not terms:
+            continue
+        covered = len(terms & vocabulary) / len(terms)
+        if covered >= coverage:
+            scored.append((covered * frequency, query))
+    return [q for _, q in sorted(scored, reverse=True)[:limit]]
+
+
+def likely_queries(article, past_queries):
+    title = " ".join(article['title'].split())
+    lead = (article.get('chunks') or [""])[0]
+    entities = headline_entities(title, lead)
+    vocabulary = set(_TOKEN.findall(f"{title} {' '.join(entities)} {lead}".lower()))
+    return [title] + entities + similar_past_queries(vocabulary, past_queries)
+
+
+def new_articles(articles, issue_ids=None):
+    ids = [a.get('issue_id') for a in articles if a.get('issue_id') is not None]
+    if not ids:
+        return []
+    wanted = set(issue_ids) if issue_ids else {max(ids)}
+    return [a for a in articles if a.get('issue_id') in wanted and a.get('title')]
+
+
+def build_plan(articles, past_queries):
+    # Round-robin over articles so a tight rate limit still covers every new article early.
+    per_article = [likely_queries(a, past_queries) for a in articles]
+    plan, seen = [], set()
+    for rank in range(max((len(q) for q in per_article), default=0)):
+        for queries in per_article:
+            if rank < len(queries) and normalize(queries[rank]) not in seen:
+                seen.add(normalize(queries[rank]))
+                plan.append(queries[rank])
+    return plan
+
+
+def run(plan, epoch, issue_ids, rpm):
+    from services import orchestrator
+
+    if orchestrator.CORPUS_EPOCH != epoch:
+        print(f"Warning: corpus changed while planning ({epoch} -> {orchestrator.CORPUS_EPOCH}).")
+    window = answer_cache.mark_published(orchestrator.CORPUS_EPOCH, issue_ids=issue_ids, planned=len(plan))
+    print(f"Warm window for epoch {orchestrator.CORPUS_EPOCH} opened at "
+          f"{time.strftime('%H:%M:%S', time.localtime(window['published_at']))}")
+
+    limiter = RateLimiter(rpm)
+    outcomes = Counter()
+    start = time.time()
+    for i, query in enumerate(plan, 1):
+        limiter.acquire()
+        try:
+            outcome = orchestrator.prewarm(query)
+        except Exception as e:
+            outcome = 'error'
+            print(f"  failed: {e}")
+        outcomes[outcome] += 1
+        print(f"[{i}/{len(plan)}] {outcome:<7} {query}")
+
+    print(f"\nPre-warmed {outcomes['warmed']} answers in {time.time() - start:.0f}s "
+          f"({outcomes['cached']} already cached, {outcomes['skipped']} not cacheable, {outcomes['error']} errors)")
+
+
+def report(epoch):
+    stats = answer_cache.warm_stats(epoch)
+    if stats is None:
+        sys.exit(f"No warm window recorded for epoch {epoch}.")
+    ratio = f"{stats['warm_hit_ratio'] * 100:.1f}%" if stats['warm_hit_ratio'] is not None else "n/a"
+    print(f"Epoch {epoch}: published {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['published_at']))}, "
+          f"window {'open' if stats['window_open'] else 'closed'}")
+    print(f"  {stats['warmed']} answers pre-warmed, {stats['queries']} queries in the first "
+          f"{answer_cache.WARM_WINDOW_SECONDS // 60} minutes, {stats['hits']} cache hits, "
+          f"{stats['warm_hits']} served from pre-warmed answers (warm-hit ratio {ratio})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer likely queries about a newly indexed issue before users ask them.")
+    parser.add_argument("--articles", default=ARTICLES_PATH)
+    parser.add_argument("--issue", type=int, action="append", help="Issue id to warm (default: the newest issue)")
+    parser.add_argument("--log", default=QUERY_LOG_PATH, help="Query log to mine for similar past queries")
+    parser.add_argument("--rpm", type=float, default=PREWARM_RPM, help="Pipeline runs per minute")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned queries")
+    parser.add_argument("--report", action="store_true", help="Print the warm-hit ratio of the first hour instead")
+    parser.add_argument("--epoch", default=None, help="Corpus epoch for --report (default: current)")
+    args = parser.parse_args()
+
+    if args.report:
+        report(args.epoch or corpus.epoch(corpus.signature()))
+        return
+
+    if not answer_cache.ANSWER_CACHE_ENABLED:
+        sys.exit("The answer cache is disabled; set ANSWER_CACHE=1 to pre-warm answers.")
+
+    with open(args.articles, "r", encoding="utf-8") as f:
+        articles = new_articles(json.load(f), args.issue)
+    if not articles:
+        sys.exit("No articles with an issue_id to pre-warm.")
+    issue_ids = sorted({a['issue_id'] for a in articles})
+    plan = build_plan(articles, load_past_queries(args.log))
+    print(f"{len(plan)} likely queries for {len(articles)} articles in issue(s) {issue_ids}")
+
+    if args.dry_run:
+        for query in plan:
+            print(f"  {query}")
+        return
+
+    try:
+        os.nice(PREWARM_NICE)
+    except (AttributeError, OSError):
+        pass
+    run(plan, corpus.epoch(corpus.signature()), issue_ids, args.rpm)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import json
 import os
+import sys
+from datetime import datetime, timezone
 import requests
 from tqdm import tqdm
 from io import BytesIO
@@ -12,6 +14,10 @@ import weaviate
 import weaviate.classes.config as wvc
 from weaviate.connect import ConnectionParams
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.embedding_cache import EmbeddingCache, content_hash, TEXT_MODEL_ID, IMAGE_MODEL_ID
+from services import corpus, digest
+
 try:
     client = weaviate.WeaviateClient(
         connection_params=ConnectionParams.from_params(
@@ -38,8 +44,13 @@ except Exception as e:
 
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device '{device}' for CLIP (images)")
-clip_model, preprocess = clip.load("ViT-B/32", device=device)
+clip_model, preprocess = None, None
+
+def _load_clip():
+    global clip_model, preprocess
+    if clip_model is None:
+        print(f"Using device '{device}' for CLIP (images)")
+        clip_model, preprocess = clip.load("ViT-B/32", device=device)
 
 try:
     with open("data/processed/batch_chunks.json", "r", encoding="utf-8") as f:
@@ -55,13 +66,29 @@ print(f"Loaded {len(batch_chunks)} chunks and {len(news_articles)} news articles
 
 TEXT_CLASS_NAME = "BatchChunk"
 IMAGE_CLASS_NAME = "BatchImage"
-def create_schemas(client):
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none").lower()
+RESCORE_LIMIT = int(os.getenv("VECTOR_RESCORE_LIMIT", 200))
+TRAINING_LIMIT = int(os.getenv("VECTOR_TRAINING_LIMIT", 10000))
+
+def build_vector_index_config(compression="none", rescore_limit=RESCORE_LIMIT, training_limit=TRAINING_LIMIT):
+    quantizers = {
+        "pq": lambda: wvc.Configure.VectorIndex.Quantizer.pq(training_limit=training_limit),
+        "bq": lambda: wvc.Configure.VectorIndex.Quantizer.bq(rescore_limit=rescore_limit),
+        "sq": lambda: wvc.Configure.VectorIndex.Quantizer.sq(rescore_limit=rescore_limit, training_limit=training_limit),
+    }
+    if compression == "none":
+        return wvc.Configure.VectorIndex.hnsw()
+    if compression not in quantizers:
+        raise ValueError(f"Unknown vector compression '{compression}', expected none, pq, bq or sq.")
+    return wvc.Configure.VectorIndex.hnsw(quantizer=quantizers[compression]())
+
+def create_schemas(client, compression=VECTOR_COMPRESSION):
     for name in [TEXT_CLASS_NAME, IMAGE_CLASS_NAME]:
         if client.collections.exists(name):
             print(f"Deleting old schema '{name}'...")
             client.collections.delete(name)
 
-    print(f"Creating schema '{TEXT_CLASS_NAME}'...")
+    print(f"Creating schema '{TEXT_CLASS_NAME}' (vector compression: {compression})...")
     client.collections.create(
         name=TEXT_CLASS_NAME,
         description="A chunk of text from a 'The Batch' news article",
@@ -70,11 +97,12 @@ def create_schemas(client):
             model="sentence-transformers/all-MiniLM-L6-v2",
             vectorize_collection_name=False
         ),
+        vector_index_config=build_vector_index_config(compression),
         
         properties=[
             wvc.Property(name="content", data_type=wvc.DataType.TEXT),
-            wvc.Property(name="issue_id", data_type=wvc.DataType.INT),
-            wvc.Property(name="issue_date", data_type=wvc.DataType.TEXT),
+            wvc.Property(name="issue_id", data_type=wvc.DataType.INT, index_range_filters=True),
+            wvc.Property(name="issue_date", data_type=wvc.DataType.DATE, index_range_filters=True),
             wvc.Property(name="issue_url", data_type=wvc.DataType.TEXT, skip_vectorization=True),
             wvc.Property(name="issue_title", data_type=wvc.DataType.TEXT, skip_vectorization=True),
             wvc.Property(name="news_title", data_type=wvc.DataType.TEXT, skip_vectorization=True),
@@ -88,36 +116,179 @@ def create_schemas(client):
         name=IMAGE_CLASS_NAME,
         description="An image from a 'The Batch' news article",
         vectorizer_config=wvc.Configure.Vectorizer.none(),
+        vector_index_config=build_vector_index_config(compression),
         
         properties=[
             wvc.Property(name="image_url", data_type=wvc.DataType.TEXT),
+            wvc.Property(name="image_phash", data_type=wvc.DataType.TEXT, skip_vectorization=True),
             wvc.Property(name="news_title", data_type=wvc.DataType.TEXT),
-            wvc.Property(name="issue_id", data_type=wvc.DataType.INT),
+            wvc.Property(name="news_titles", data_type=wvc.DataType.TEXT_ARRAY),
+            wvc.Property(name="issue_id", data_type=wvc.DataType.INT, index_range_filters=True),
+            wvc.Property(name="issue_ids", data_type=wvc.DataType.INT_ARRAY),
+            wvc.Property(name="issue_date", data_type=wvc.DataType.DATE, index_range_filters=True),
+            wvc.Property(name="first_issue_date", data_type=wvc.DataType.DATE, index_range_filters=True),
             wvc.Property(name="issue_url", data_type=wvc.DataType.TEXT),
+            wvc.Property(name="issue_urls", data_type=wvc.DataType.TEXT_ARRAY),
         ],
     )
 
     print("Schemas created successfully!")
 
 
-def get_image_embedding(image_url):
+def to_rfc3339(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+PHASH_MAX_DISTANCE = 6
+
+def download_image(image_url):
     try:
         response = requests.get(image_url, timeout=10)
         response.raise_for_status()
-        img = Image.open(BytesIO(response.content)).convert("RGB")
+        return Image.open(BytesIO(response.content)).convert("RGB"), response.content
+    except Exception as e:
+        print(f"Error downloading image {image_url}: {e}")
+        return None, None
+
+def compute_dhash(img, hash_size=8):
+    gray = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+def get_image_embedding(img):
+    try:
+        _load_clip()
         img_preprocessed = preprocess(img).unsqueeze(0).to(device)
         with torch.no_grad():
             embedding = clip_model.encode_image(img_preprocessed)
         return embedding.cpu().numpy().flatten()
     except Exception as e:
-        print(f"Error processing image {image_url}: {e}")
+        print(f"Error encoding image: {e}")
         return None
 
-def import_text_data(client, chunks_data):
+class PhashIndex:
+    # Pigeonhole bucketing: split the 64-bit dHash into PHASH_MAX_DISTANCE + 1 bands. Two hashes within
+    # that distance agree exactly on at least one band, so only groups sharing a band value are compared.
+    def __init__(self, max_distance=PHASH_MAX_DISTANCE, bits=64):
+        bands = max_distance + 1
+        widths = [bits // bands + (1 if i < bits % bands else 0) for i in range(bands)]
+        self.max_distance = max_distance
+        self.bands = []
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+        self.buckets = [{} for _ in self.bands]
+        self.groups = []
+
+    def _keys(self, phash):
+        value = int(phash, 16)
+        return [(value >> shift) & mask for shift, mask in self.bands]
+
+    def find(self, phash):
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._keys(phash)):
+            candidates.update(bucket.get(key, ()))
+        # The earliest matching group wins, as with a scan in insertion order.
+        for position in sorted(candidates):
+            group = self.groups[position]
+            if hamming_distance(group["image_phash"], phash) <= self.max_distance:
+                return group
+        return None
+
+    def add(self, group):
+        position = len(self.groups)
+        self.groups.append(group)
+        for bucket, key in zip(self.buckets, self._keys(group["image_phash"])):
+            bucket.setdefault(key, []).append(position)
+
+def _embed_image(image_url, cache):
+    # Keyed by URL plus a hash of the bytes: an image replaced at the same URL is embedded again.
+    img, raw_bytes = download_image(image_url)
+    if img is None:
+        return None, None
+
+    bytes_hash = content_hash(raw_bytes)
+    key = f"{image_url}#{bytes_hash}"
+    cached = cache.get(IMAGE_MODEL_ID, key)
+    if cached is not None:
+        return cached["vector"], cached["phash"]
+
+    cached = cache.get_by_bytes_hash(IMAGE_MODEL_ID, bytes_hash)
+    if cached is not None:
+        vector, phash = cached["vector"], cached["phash"]
+    else:
+        phash = compute_dhash(img)
+        vector = get_image_embedding(img)
+        if vector is None:
+            return None, None
+
+    cache.put(IMAGE_MODEL_ID, key, vector, bytes_hash=bytes_hash, phash=phash)
+    return vector, phash
+
+def group_article_images(articles_data, cache):
+    index = PhashIndex()
+    url_to_group = {}
+
+    for article in tqdm(articles_data):
+        image_info = article.get("image")
+        if not image_info or not image_info.get("url"):
+            continue
+
+        image_url = image_info["url"]
+        group = url_to_group.get(image_url)
+
+        if group is None:
+            vector, phash = _embed_image(image_url, cache)
+            if vector is None:
+                continue
+
+            group = index.find(phash)
+            if group is None:
+                group = {"image_url": image_url, "image_phash": phash, "vector": vector, "articles": []}
+                index.add(group)
+
+            url_to_group[image_url] = group
+
+        group["articles"].append(article)
+
+    url_to_canonical = {url: group["image_url"] for url, group in url_to_group.items()}
+    return index.groups, url_to_canonical
+
+def _backfill_text_cache(text_collection, cache):
+    added = 0
+    for obj in text_collection.iterator(include_vector=True, return_properties=["content"]):
+        key = content_hash(obj.properties.get("content") or "")
+        vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+        if vector and cache.get(TEXT_MODEL_ID, key) is None:
+            cache.put(TEXT_MODEL_ID, key, vector)
+            added += 1
+    print(f"Cached {added} new text vectors computed by Weaviate.")
+
+def import_text_data(client, chunks_data, cache, url_to_canonical=None):
+    url_to_canonical = url_to_canonical or {}
     print(f"\n--- Importing {len(chunks_data)} text chunks ---")
     text_collection = client.collections.get(TEXT_CLASS_NAME)
 
     failed_objects = []
+    cache_misses = 0
 
     with text_collection.batch.fixed_size(batch_size=10, concurrent_requests=1) as batch:
         for chunk in tqdm(chunks_data):
@@ -130,15 +301,22 @@ def import_text_data(client, chunks_data):
                 props = {
                     "content": str(content),
                     "issue_id": int(chunk.get("issue_id") or 0),
-                    "issue_date": str(chunk.get("issue_date") or ""),
                     "issue_url": str(chunk.get("issue_url") or ""),
                     "issue_title": str(chunk.get("issue_title") or ""),
                     "news_title": str(chunk.get("news_title") or ""),
-                    "image_url": str(image_data.get("url") or ""),
+                    "image_url": str(url_to_canonical.get(image_data.get("url"), image_data.get("url")) or ""),
                     "image_caption": str(image_data.get("caption") or ""),
                 }
+                issue_date = to_rfc3339(chunk.get("issue_date"))
+                if issue_date:
+                    props["issue_date"] = issue_date
 
-                batch.add_object(properties=props)
+                cached = cache.get(TEXT_MODEL_ID, content_hash(props["content"]))
+                if cached is not None:
+                    batch.add_object(properties=props, vector=cached["vector"].tolist())
+                else:
+                    batch.add_object(properties=props)
+                    cache_misses += 1
 
             except Exception as e:
                 failed_objects.append({"object": chunk, "error": str(e)})
@@ -162,38 +340,52 @@ def import_text_data(client, chunks_data):
     else:
         print("Text chunks imported successfully.")
 
+    print(f"Text vectors: {cache_misses} vectorized by Weaviate, the rest restored from the embedding cache.")
+    if cache_misses:
+        _backfill_text_cache(text_collection, cache)
 
-def import_image_data(client, articles_data):
+
+def import_image_data(client, articles_data, cache):
     print(f"\n--- Importing images from {len(articles_data)} articles ---")
     image_collection = client.collections.get(IMAGE_CLASS_NAME)
-    processed = 0
-
-    with image_collection.batch.dynamic() as batch:
-        for article in tqdm(articles_data):
-            image_info = article.get("image")
-            if not image_info or not image_info.get("url"):
-                continue
 
-            vector = get_image_embedding(image_info["url"])
-            if vector is None:
-                continue
+    groups, url_to_canonical = group_article_images(articles_data, cache)
+    referenced = sum(len(group["articles"]) for group in groups)
 
+    with image_collection.batch.dynamic() as batch:
+        for group in groups:
+            articles = group["articles"]
+            issue_ids = [a["issue_id"] for a in articles if a.get("issue_id") is not None]
             props = {
-                "image_url": image_info["url"],
-                "news_title": article.get("title", ""),
-                "issue_id": article.get("issue_id", 0),
-                "issue_url": article.get("issue_url", ""),
+                "image_url": group["image_url"],
+                "image_phash": group["image_phash"],
+                "news_title": articles[0].get("title", ""),
+                "news_titles": [a.get("title", "") for a in articles],
+                "issue_id": issue_ids[0] if issue_ids else 0,
+                "issue_ids": issue_ids,
+                "issue_url": articles[0].get("issue_url", ""),
+                "issue_urls": [a.get("issue_url", "") for a in articles],
             }
-            batch.add_object(properties=props, vector=vector.tolist())
-            processed += 1
+            # A shared image spans every article's date, so date filters test [first_issue_date, issue_date].
+            issue_dates = [d for d in (to_rfc3339(a.get("issue_date")) for a in articles) if d]
+            if issue_dates:
+                props["first_issue_date"] = min(issue_dates)
+                props["issue_date"] = max(issue_dates)
+            batch.add_object(properties=props, vector=group["vector"].tolist())
 
-    print(f"Imported {processed} images successfully.")
+    print(f"Imported {len(groups)} unique images referenced by {referenced} articles "
+          f"({referenced - len(groups)} duplicates collapsed).")
+    return url_to_canonical
 
 
 if __name__ == "__main__":
+    embedding_cache = EmbeddingCache()
+
     create_schemas(client)
-    import_text_data(client, batch_chunks)
-    import_image_data(client, news_articles)
+    url_to_canonical = import_image_data(client, news_articles, embedding_cache)
+    embedding_cache.save()
+    import_text_data(client, batch_chunks, embedding_cache, url_to_canonical)
+    embedding_cache.save()
 
     print("\n=== Verification ===")
     text_collection = client.collections.get(TEXT_CLASS_NAME)
@@ -205,5 +397,14 @@ if __name__ == "__main__":
     print(f"Text chunk count in Weaviate: {text_count}")
     print(f"Image count in Weaviate: {image_count}")
 
+    digests = digest.build_digests(news_articles)
+    digest.save_digests(digests)
+    print(f"Saved {len(digests)} extractive article digests to {digest.DIGESTS_PATH}")
+
+    marker = corpus.write_generation_marker(
+        articles=len(news_articles), text_chunks=text_count, images=image_count
+    )
+    print(f"Published index generation {marker['generation']} to {corpus.GENERATION_PATH}")
+
     client.close()
     print("Connection to Weaviate closed.")
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.query_log import QUERY_LOG_PATH
+
+PERCENTILES = [50, 90, 95, 99]
+CACHED_OUTCOMES = ("hit", "coalesced")
+
+
+def load_log(path, limit=None, include_replays=False):
+    records, skipped = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("source") == "replay" and not include_replays:
+                continue
+            if not entry.get("query"):
+                skipped += 1
+                continue
+            records.append(entry)
+
+    if skipped:
+        print(f"Skipped {skipped} records without query text (logged with QUERY_LOG_MODE=hashed).")
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+
+def _send(session_factory, target, query, timeout):
+    session = session_factory()
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{target}/api/query", json={"query": query},
+                                headers={"X-Replay": "1"}, timeout=timeout)
+        latency = time.perf_counter() - start
+        cache = response.json().get("meta", {}).get("cache") if response.ok else None
+        return response.status_code, latency, cache
+    except requests.RequestException as e:
+        return f"error: {type(e).__name__}", time.perf_counter() - start, None
+
+
+def replay(records, target, speed=1.0, concurrency=32, timeout=120, output=None):
+    local = threading.local()
+
+    def session_factory():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    results, lock = [], threading.Lock()
+
+    def run(record, offset, scheduled_at):
+        lag = time.perf_counter() - scheduled_at
+        status, latency, cache = _send(session_factory, target, record["query"], timeout)
+        with lock:
+            results.append({
+                "offset_s": round(offset, 3),
+                "query": record["query"],
+                "status": status,
+                "latency_ms": round(latency * 1000, 1),
+                "send_lag_ms": round(lag * 1000, 1),
+                "cache": cache,
+            })
+
+    t0 = records[0]["t"]
+    start = time.perf_counter()
+    print(f"Replaying {len(records)} queries against {target} "
+          f"({'as fast as possible' if speed <= 0 else f'{speed:g}x original timing'}, up to {concurrency} in flight)")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            offset = (record["t"] - t0) / speed if speed > 0 else 0.0
+            scheduled_at = start + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, record, offset, scheduled_at)
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["offset_s"])
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        print(f"Wrote {len(results)} results to {output}")
+    return results, elapsed
+
+
+def summarize(results):
+    ok = [r for r in results if r["status"] == 200]
+    latencies = np.array([r["latency_ms"] for r in ok]) if ok else np.zeros(1)
+    lags = np.array([r["send_lag_ms"] for r in results]) if results else np.zeros(1)
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "cache_hit_rate": sum(r["cache"] in CACHED_OUTCOMES for r in ok) / len(ok) if ok else 0.0,
+        "send_lag_p95_ms": float(np.percentile(lags, 95)),
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = float(np.percentile(latencies, p))
+    summary["max_ms"] = float(latencies.max())
+    return summary
+
+
+def print_summary(name, summary):
+    print(f"\n[{name}] {summary['requests']} requests, {summary['errors']} errors, "
+          f"cache hit rate {summary['cache_hit_rate'] * 100:.1f}%")
+    print("  latency " + " ".join(f"p{p}={summary[f'p{p}_ms']:.0f}ms" for p in PERCENTILES)
+          + f" max={summary['max_ms']:.0f}ms")
+    if summary["send_lag_p95_ms"] > 50:
+        print(f"  warning: p95 send lag {summary['send_lag_p95_ms']:.0f}ms, raise --concurrency for faithful timing")
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(baseline_path, candidate_path):
+    baseline, candidate = summarize(load_results(baseline_path)), summarize(load_results(candidate_path))
+    print(f"{'metric':<16}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for key in ["requests", "errors", "cache_hit_rate"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms"]:
+        a, b = baseline[key], candidate[key]
+        change = f"{(b - a) / a * 100:+.0f}%" if a and key.endswith("_ms") else f"{b - a:+.3g}"
+        print(f"{key:<16}{a:>12.3g}{b:>12.3g}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded query log against a server and compare builds.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("replay", help="Re-issue logged queries with their original spacing")
+    run_parser.add_argument("--log", default=QUERY_LOG_PATH)
+    run_parser.add_argument("--target", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Time scale: 2 = twice as fast, 0 = no delays")
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--limit", type=int, default=None)
+    run_parser.add_argument("--timeout", type=float, default=120)
+    run_parser.add_argument("--output", default=None, help="Write per-request results here for a later compare")
+
+    compare_parser = sub.add_parser("compare", help="Compare two replay result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.baseline, args.candidate)
+        return
+
+    records = load_log(args.log, args.limit)
+    if not records:
+        sys.exit(f"No replayable queries in {args.log}.")
+    results, elapsed = replay(records, args.target.rstrip("/"), args.speed, args.concurrency, args.timeout, args.output)
+    print_summary(args.target, summarize(results))
+    print(f"  wall time {elapsed:.1f}s (recorded span {records[-1]['t'] - records[0]['t']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["BATCH_RAG_DEFER_CONNECT"] = "1"
+os.environ["GEN_BACKEND"] = "stub"
+
+from services import generation_service
+from services.corpus import ARTICLES_PATH
+
+CANDIDATES_PER_PROMPT = 6
+CHARS_PER_TOKEN = 4
+
+
+def load_articles(path, count):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            articles = json.load(f)
+        articles = [{"title": a["title"], "date": a.get("issue_date"), "content": "\n\n".join(a.get("chunks", []))}
+                    for a in articles if a.get("title")]
+    else:
+        articles = [{"title": f"Article {i}", "date": "2024-01-01", "content": f"Body of article {i}. " * 300}
+                    for i in range(count)]
+    # Images are left out so the simulation never touches the network.
+    return articles[:count]
+
+
+def sample_candidates(articles, weights, rng):
+    picked = {}
+    while len(picked) < CANDIDATES_PER_PROMPT:
+        art = rng.choices(articles, weights)[0]
+        picked[art["title"]] = {**art, "score": rng.random(), "digest": art["content"][:600]}
+    return list(picked.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a skewed candidate workload through the stub generation backend.")
+    parser.add_argument("--articles", default=ARTICLES_PATH)
+    parser.add_argument("--pool", type=int, default=300, help="Number of distinct articles in the workload")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of article popularity")
+    parser.add_argument("--expire-every", type=int, default=500, help="Expire the cached context every N requests")
+    parser.add_argument("--reload-at", type=int, default=1200, help="Switch to a new corpus epoch at request N (0 = never)")
+    args = parser.parse_args()
+
+    backend = generation_service.backend
+    backend.rebuild_interval = 0
+    articles = load_articles(args.articles, args.pool)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(len(articles))]
+    rng = random.Random(0)
+
+    inline_chars, window, epoch = 0, [], "sim-0"
+    for n in range(1, args.requests + 1):
+        reloaded = n == args.reload_at
+        if reloaded:
+            epoch = f"sim-{n}"
+        candidates = sample_candidates(articles, weights, rng)
+        parts = [backend.instructions] + generation_service._build_prompt_parts(f"query {n}", candidates, set())
+        inline_chars += sum(len(p) for p in parts if isinstance(p, str))
+        if args.expire_every and n % args.expire_every == 0 and n < args.requests:
+            backend.expire_next = True
+
+        before = backend.hits
+        answer, _ = generation_service.generate_answer_with_ranking(f"query {n}", candidates, epoch)
+        if answer.startswith("Error"):
+            sys.exit(f"FAIL: request {n} returned {answer!r}")
+        if reloaded and backend.hits > before:
+            sys.exit(f"FAIL: request {n} hit articles cached under the previous corpus epoch")
+        window.append(backend.hits - before)
+        if n % (args.requests // 4) == 0:
+            recent = window[-(args.requests // 4):]
+            print(f"after {n:>5} requests: hit rate over last {len(recent)} = "
+                  f"{sum(recent) / (len(recent) * CANDIDATES_PER_PROMPT) * 100:.1f}%")
+
+    stats = backend.stats()
+    sent = stats["input_chars"]
+    print(f"\n{stats['requests']} requests, {stats['hits']} article hits / {stats['misses']} misses, "
+          f"{stats['builds']} cache builds, {stats['fallbacks']} inline fallbacks after expiry")
+    print(f"Cached context: {backend.cached_chars} chars (~{backend.cached_chars / CHARS_PER_TOKEN:.0f} tokens) "
+          f"holding {stats['cached_articles']} articles plus the instructions")
+    print(f"Uncached input per request: {inline_chars / args.requests:.0f} -> {sent / args.requests:.0f} chars "
+          f"(~{inline_chars / args.requests / CHARS_PER_TOKEN:.0f} -> ~{sent / args.requests / CHARS_PER_TOKEN:.0f} tokens, "
+          f"{(1 - sent / inline_chars) * 100:.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import random
+import argparse
+from types import SimpleNamespace
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["BATCH_RAG_DEFER_CONNECT"] = "1"
+os.environ.setdefault("EMBEDDING_SIDECAR_SOCKET", "/tmp/batch_rag_fault_simulation.sock")
+
+from services import orchestrator, retrieval_service
+from services.resilience import (
+    Deadline, DeadlineExceeded, CircuitBreaker, LatencyTracker, call_with_resilience
+)
+
+SAMPLE_QUERIES = [
+    "robots in a factory", "new open-weights language model", "GPU data center",
+    "AI regulation in Europe", "self-driving cars", "protein folding",
+]
+
+# name: (text faults, image faults) as (slow probability, slow seconds, error probability)
+SCENARIOS = {
+    "healthy": ((0.0, 0.0, 0.0), (0.0, 0.0, 0.0)),
+    "slow-text-tail": ((0.1, 3.0, 0.0), (0.0, 0.0, 0.0)),
+    "slow-image-shard": ((0.0, 0.0, 0.0), (0.5, 3.0, 0.0)),
+    "image-outage": ((0.0, 0.0, 0.0), (0.0, 0.0, 1.0)),
+}
+
+
+class FaultyQuery:
+    def __init__(self, name, slow_probability, slow_seconds, error_probability, base_latency=0.02):
+        self.name = name
+        self.slow_probability = slow_probability
+        self.slow_seconds = slow_seconds
+        self.error_probability = error_probability
+        self.base_latency = base_latency
+
+    def hybrid(self, query, limit=None, group_by=None, **kwargs):
+        time.sleep(random.expovariate(1 / self.base_latency))
+        if random.random() < self.slow_probability:
+            time.sleep(self.slow_seconds)
+        if random.random() < self.error_probability:
+            raise RuntimeError(f"Injected failure in '{self.name}'")
+
+        if group_by is not None:
+            groups = {}
+            for i in range(group_by.number_of_groups):
+                title = f"{query} #{i}"
+                groups[title] = SimpleNamespace(objects=[
+                    self._object({"news_title": title, "content": f"chunk {j} of {title}", "issue_date": "2024-01-01"},
+                                 score=1.0 - i * 0.05)
+                    for j in range(group_by.objects_per_group)
+                ])
+            return SimpleNamespace(groups=groups, objects=[])
+
+        return SimpleNamespace(objects=[
+            self._object({"news_title": f"{query} #{i}", "image_url": f"https://example.com/{i}.png",
+                          "issue_url": f"https://example.com/issue/{i}"}, score=1.0 - i * 0.05)
+            for i in range(limit or 5)
+        ])
+
+    def _object(self, properties, score):
+        return SimpleNamespace(properties=properties, metadata=SimpleNamespace(score=score, explain_score=""))
+
+
+class FakeEncoder:
+    def encode_texts(self, texts):
+        return np.random.rand(len(texts), 512).astype(np.float32)
+
+
+def install_scenario(text_faults, image_faults):
+    retrieval_service.text_collection = SimpleNamespace(query=FaultyQuery("BatchChunk", *text_faults))
+    retrieval_service.image_collection = SimpleNamespace(query=FaultyQuery("BatchImage", *image_faults))
+    for breaker in retrieval_service.breakers.values():
+        breaker.record_success()
+
+
+def run_one(query, deadline_seconds):
+    degraded = {}
+    start = time.monotonic()
+    orchestrator.retrieve_candidates(query, deadline=Deadline(deadline_seconds), degraded=degraded)
+    return time.monotonic() - start, degraded
+
+
+def run_scenario(name, requests, concurrency, deadline_seconds):
+    install_scenario(*SCENARIOS[name])
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(requests)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda q: run_one(q, deadline_seconds), queries))
+
+    latencies = np.array([latency for latency, _ in results])
+    reasons = Counter(f"{branch}:{reason}" for _, degraded in results for branch, reason in degraded.items())
+    states = {name: breaker.state for name, breaker in retrieval_service.breakers.items()}
+
+    print(f"\n[{name}] {requests} requests, deadline {deadline_seconds:.2f}s, hedging {'on' if retrieval_service.HEDGE_QUERIES else 'off'}")
+    print(f"  latency p50={np.percentile(latencies, 50) * 1000:.0f}ms "
+          f"p95={np.percentile(latencies, 95) * 1000:.0f}ms max={latencies.max() * 1000:.0f}ms")
+    print(f"  degraded: {dict(reasons) or 'none'}")
+    print(f"  breakers: {states}")
+
+    # Let calls abandoned at the deadline finish so they do not occupy the pools of the next scenario.
+    time.sleep(max(faults[1] for faults in SCENARIOS[name]))
+    return latencies.max()
+
+
+def check_expired_deadline_probe():
+    # A half-open breaker whose probe arrives after the deadline must still be able to close again.
+    breaker = CircuitBreaker("probe-check", failure_threshold=1, reset_timeout=0.05, max_workers=1)
+    tracker = LatencyTracker()
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    expired = Deadline(0)
+    try:
+        call_with_resilience(lambda: "ok", breaker, tracker, deadline=expired)
+    except DeadlineExceeded:
+        pass
+    try:
+        recovered = call_with_resilience(lambda: "ok", breaker, tracker, deadline=Deadline(1.0)) == "ok"
+    except Exception:
+        recovered = False
+    breaker.executor.shutdown()
+
+    print(f"\n[expired-deadline-probe] breaker {'recovered' if recovered else 'stuck open'} after a probe past its deadline")
+    return recovered
+
+
+def check_abandoned_calls_cancelled():
+    # A call still queued when its deadline fires must never run: the caller has already given up on it.
+    breaker = CircuitBreaker("cancel-check", max_workers=1)
+    tracker = LatencyTracker()
+    ran = []
+    breaker.executor.submit(time.sleep, 0.3)
+    try:
+        call_with_resilience(lambda: ran.append(1), breaker, tracker, deadline=Deadline(0.05))
+    except DeadlineExceeded:
+        pass
+    breaker.executor.shutdown(wait=True)
+
+    print(f"[abandoned-call] queued call {'ran after its deadline' if ran else 'was cancelled'}")
+    return not ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inject latency tails and errors into retrieval and check that the deadline bounds request latency.")
+    parser.add_argument("--scenario", choices=list(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--deadline", type=float, default=0.5)
+    parser.add_argument("--hedge", action="store_true", help="Send hedged duplicate queries after the observed p95")
+    parser.add_argument("--slack", type=float, default=0.2, help="Allowed overshoot past the deadline in seconds")
+    args = parser.parse_args()
+
+    retrieval_service.clip_encoder = FakeEncoder()
+    retrieval_service.HEDGE_QUERIES = args.hedge
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    worst = max(run_scenario(name, args.requests, args.concurrency, args.deadline) for name in scenarios)
+
+    probe_ok = check_expired_deadline_probe()
+    cancel_ok = check_abandoned_calls_cancelled()
+
+    bound = args.deadline + args.slack
+    print(f"\nWorst request latency {worst:.2f}s (bound {bound:.2f}s)")
+    if worst > bound:
+        sys.exit("FAIL: request latency exceeded the deadline bound.")
+    if not probe_ok:
+        sys.exit("FAIL: a half-open probe past its deadline left the breaker stuck open.")
+    if not cancel_ok:
+        sys.exit("FAIL: a call abandoned at its deadline still ran.")
+    print("OK: every request finished within the deadline bound and breakers recover after late probes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from diskcache import Cache
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "0") == "1"
+ANSWER_CACHE_DIR = os.getenv("ANSWER_CACHE_DIR", "data/cache/answers")
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 86400))
+ANSWER_CACHE_SIZE_MB = int(os.getenv("ANSWER_CACHE_SIZE_MB", 512))
+WARM_WINDOW_SECONDS = int(os.getenv("PREWARM_WINDOW_SECONDS", 3600))
+WARM_STATS_TTL_SECONDS = 7 * 86400
+WINDOW_RECHECK_SECONDS = 5.0
+
+_lock = threading.Lock()
+_cache = None
+_cache_pid = None
+_windows = {}
+
+
+def _open():
+    global _cache, _cache_pid
+    with _lock:
+        # SQLite handles must not cross a fork, so every worker opens its own.
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = Cache(ANSWER_CACHE_DIR, size_limit=ANSWER_CACHE_SIZE_MB * 1024 * 1024)
+            _cache_pid = os.getpid()
+        return _cache
+
+
+def cache_key(query_key):
+    payload = json.dumps(query_key, ensure_ascii=False, default=str)
+    return "answer:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(query_key):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        return _open().get(cache_key(query_key))
+    except Exception as e:
+        print(f"(AnswerCache) Lookup failed: {e}")
+        return None
+
+
+def put(query_key, result, warmed=False):
+    if not ANSWER_CACHE_ENABLED:
+        return
+    entry = {"result": result, "stored_at": time.time(), "warmed": warmed}
+    try:
+        _open().set(cache_key(query_key), entry, expire=ANSWER_CACHE_TTL_SECONDS)
+    except Exception as e:
+        print(f"(AnswerCache) Could not store answer: {e}")
+
+
+def mark_published(epoch, **info):
+    """Opens the warm-hit window for a corpus epoch; re-running the pre-warm job keeps the original start."""
+    cache = _open()
+    window = {"epoch": epoch, "published_at": time.time(), **info}
+    cache.add(f"warm:{epoch}", window, expire=WARM_STATS_TTL_SECONDS)
+    for counter in ("queries", "hits", "warm_hits", "warmed"):
+        cache.add(f"warm:{epoch}:{counter}", 0, expire=WARM_STATS_TTL_SECONDS)
+    return cache.get(f"warm:{epoch}")
+
+
+def count_warmed(epoch):
+    _open().incr(f"warm:{epoch}:warmed")
+
+
+def _window(epoch):
+    now = time.monotonic()
+    cached = _windows.get(epoch)
+    if cached is None or (cached[1] is None and now - cached[0] > WINDOW_RECHECK_SECONDS):
+        cached = _windows[epoch] = (now, _open().get(f"warm:{epoch}"))
+    return cached[1]
+
+
+def record_lookup(epoch, hit, warmed):
+    if not ANSWER_CACHE_ENABLED:
+        return
+    try:
+        window = _window(epoch)
+        if window is None or time.time() - window["published_at"] > WARM_WINDOW_SECONDS:
+            return
+        cache = _open()
+        cache.incr(f"warm:{epoch}:queries")
+        if hit:
+            cache.incr(f"warm:{epoch}:hits")
+        if warmed:
+            cache.incr(f"warm:{epoch}:warm_hits")
+    except Exception as e:
+        print(f"(AnswerCache) Could not record warm-window lookup: {e}")
+
+
+def warm_stats(epoch):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    cache = _open()
+    window = cache.get(f"warm:{epoch}")
+    if window is None:
+        return None
+    counts = {c: cache.get(f"warm:{epoch}:{c}", 0) for c in ("queries", "hits", "warm_hits", "warmed")}
+    elapsed = time.time() - window["published_at"]
+    return {
+        **window,
+        **counts,
+        "window_open": elapsed <= WARM_WINDOW_SECONDS,
+        "warm_hit_ratio": counts["warm_hits"] / counts["queries"] if counts["queries"] else None,
+    }
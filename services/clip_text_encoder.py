@@ -0,0 +1,105 @@
+import os
+import torch
+import clip
+import numpy as np
+
+CLIP_MODEL_NAME = "ViT-B/32"
+DEFAULT_EXPORT_PATH = "models/clip_vit_b32_text_int8.pt"
+NUM_THREADS = int(os.getenv("CLIP_NUM_THREADS", 0))
+
+
+class CLIPTextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.token_embedding = model.token_embedding
+        self.positional_embedding = model.positional_embedding
+        self.transformer = model.transformer
+        self.ln_final = model.ln_final
+        self.text_projection = model.text_projection
+
+    def forward(self, text):
+        x = self.token_embedding(text) + self.positional_embedding
+        x = x.permute(1, 0, 2)
+        x = self.transformer(x)
+        x = x.permute(1, 0, 2)
+        x = self.ln_final(x)
+        return x[torch.arange(x.shape[0]), text.argmax(dim=-1)] @ self.text_projection
+
+
+class TextEncoder:
+    def __init__(self, module):
+        self.module = module
+
+    def encode_text(self, tokens):
+        return self.module(tokens)
+
+
+def configure_threads(num_threads=NUM_THREADS):
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+
+def build_quantized_text_tower(model_name=CLIP_MODEL_NAME):
+    model, _ = clip.load(model_name, device="cpu", jit=False)
+    tower = CLIPTextTower(model.float()).eval()
+    del model
+    return torch.quantization.quantize_dynamic(tower, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_text_encoder(path=DEFAULT_EXPORT_PATH, model_name=CLIP_MODEL_NAME):
+    tower = build_quantized_text_tower(model_name)
+    example = clip.tokenize(["a photo of a robot", "a chart"])
+    with torch.no_grad():
+        traced = torch.jit.trace(tower, example)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torch.jit.save(traced, path)
+    return path
+
+
+def load_text_encoder(path=DEFAULT_EXPORT_PATH):
+    configure_threads()
+    module = torch.jit.load(path, map_location="cpu").eval()
+    return TextEncoder(module)
+
+
+class CLIPEncoder:
+    def __init__(self, text_model, text_device, image_model=None, preprocess=None, image_device="cpu"):
+        self.text_model = text_model
+        self.text_device = text_device
+        self.image_model = image_model
+        self.preprocess = preprocess
+        self.image_device = image_device
+        self.description = (
+            "Quantized CLIP text encoder" if isinstance(text_model, TextEncoder)
+            else f"CLIP model on '{text_device}'"
+        )
+
+    def encode_texts(self, texts) -> np.ndarray:
+        with torch.no_grad():
+            tokens = clip.tokenize(list(texts), truncate=True).to(self.text_device)
+            features = self.text_model.encode_text(tokens)
+        return features.float().cpu().numpy()
+
+    def encode_images(self, images) -> np.ndarray:
+        if self.image_model is None:
+            raise RuntimeError("CLIP vision tower is not loaded.")
+        with torch.no_grad():
+            batch = torch.stack([self.preprocess(img) for img in images]).to(self.image_device)
+            features = self.image_model.encode_image(batch)
+        return features.float().cpu().numpy()
+
+
+def load_local_encoder(text_encoder_path=None, with_vision=False):
+    text_encoder_path = text_encoder_path or DEFAULT_EXPORT_PATH
+    configure_threads()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    use_quantized = device == "cpu" and os.path.exists(text_encoder_path)
+
+    full_model, preprocess = None, None
+    if with_vision or not use_quantized:
+        full_model, preprocess = clip.load(CLIP_MODEL_NAME, device=device)
+
+    if use_quantized:
+        return CLIPEncoder(load_text_encoder(text_encoder_path), "cpu", full_model, preprocess, device)
+    return CLIPEncoder(full_model, device, full_model, preprocess, device)
@@ -0,0 +1,103 @@
+import os
+import json
+import threading
+from datetime import datetime
+from .digest import DIGESTS_PATH, load_digests
+
+ARTICLES_PATH = os.getenv("ARTICLES_DB_PATH", "data/processed/news_articles.json")
+GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", "data/processed/index_generation.json")
+
+
+def load_articles(path=ARTICLES_PATH, digests_path=DIGESTS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        articles_data = json.load(f)
+    digests = load_digests(digests_path)
+
+    articles_db = {}
+    for art in articles_data:
+        full_text = "\n\n".join(art.get('chunks', []))
+
+        date_val = art.get('issue_date') or art.get('date') or '1970-01-01'
+
+        articles_db[art.get('title')] = {
+            'news_id': art.get('news_id'),
+            'content': full_text,
+            'date': date_val,
+            'url': art.get('issue_url') or art.get('url'),
+            'digest': digests.get(art.get('title'))
+        }
+    return articles_db
+
+
+def read_generation(path=GENERATION_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("generation", 0)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+
+
+def write_generation_marker(path=GENERATION_PATH, **stats):
+    marker = {
+        "generation": read_generation(path) + 1,
+        "created_at": datetime.now().isoformat(),
+        **stats,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f, indent=2)
+    os.replace(tmp_path, path)
+    return marker
+
+
+def signature(articles_path=ARTICLES_PATH, generation_path=GENERATION_PATH):
+    try:
+        stat = os.stat(articles_path)
+        file_version = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        file_version = (0, 0)
+    return (read_generation(generation_path),) + file_version
+
+
+def epoch(corpus_signature):
+    generation, mtime_ns, _ = corpus_signature
+    return f"{generation}-{mtime_ns}"
+
+
+class CorpusRefresher:
+    def __init__(self, on_change, interval, initial_signature=None):
+        self.on_change = on_change
+        self.interval = interval
+        self.signature = initial_signature
+        self._pid = None
+        self._stop = threading.Event()
+
+    def check(self):
+        current = signature()
+        if current == self.signature:
+            return False
+        try:
+            self.on_change(current)
+        except Exception as e:
+            # Usually a file caught mid-write; the signature is left unchanged so the next tick retries.
+            print(f"(Corpus) Reload failed, keeping the current corpus: {e}")
+            return False
+        self.signature = current
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        # Threads do not survive fork, so every worker process starts its own refresher.
+        self._pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self._run, name="corpus-refresher", daemon=True).start()
+        print(f"(Corpus) Watching '{ARTICLES_PATH}' and '{GENERATION_PATH}' every {self.interval:g}s.")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+
+DIGESTS_PATH = os.getenv("ARTICLE_DIGESTS_PATH", "data/processed/article_digests.json")
+DIGEST_MAX_CHARS = int(os.getenv("DIGEST_MAX_CHARS", 900))
+REDUNDANCY_THRESHOLD = 0.6
+
+# The Batch articles open with a lead and then use labelled sections; the lead and the
+# first sentence of these sections carry most of the article's substance.
+SECTION_BONUS = {"why it matters": 0.3, "what's new": 0.2, "how it works": 0.15, "results": 0.15}
+LEAD_BONUS = 0.25
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n+")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if len(s.strip()) > 20]
+
+
+def _tokens(sentence):
+    return _TOKEN.findall(sentence.lower())
+
+
+def _norm(vector):
+    return math.sqrt(sum(w * w for w in vector.values())) or 1.0
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(t, 0.0) for t, w in a.items()) / (_norm(a) * _norm(b))
+
+
+def _section_bonus(sentence):
+    label = sentence.split(":", 1)[0].lower() if ":" in sentence[:40] else ""
+    return SECTION_BONUS.get(label, 0.0)
+
+
+def _article_text(article):
+    # Chunks overlap, so consecutive chunks repeat sentences; keep the first occurrence of each.
+    seen, sentences = set(), []
+    for chunk in article.get('chunks', []):
+        for sentence in split_sentences(chunk):
+            if sentence not in seen:
+                seen.add(sentence)
+                sentences.append(sentence)
+    return sentences
+
+
+def summarize(sentences, idf, max_chars=DIGEST_MAX_CHARS):
+    vectors = []
+    for sentence in sentences:
+        counts = Counter(_tokens(sentence))
+        vectors.append({t: (1 + math.log(c)) * idf.get(t, 0.0) for t, c in counts.items()})
+
+    centroid = Counter()
+    for vector in vectors:
+        centroid.update(vector)
+
+    scored = []
+    for i, (sentence, vector) in enumerate(zip(sentences, vectors)):
+        score = _cosine(vector, centroid) + _section_bonus(sentence) + (LEAD_BONUS if i == 0 else 0.0)
+        scored.append((score, i))
+    scored.sort(reverse=True)
+
+    selected, length = [], 0
+    for _, i in scored:
+        if length + len(sentences[i]) > max_chars and selected:
+            continue
+        if any(_cosine(vectors[i], vectors[j]) > REDUNDANCY_THRESHOLD for j in selected):
+            continue
+        selected.append(i)
+        length += len(sentences[i]) + 1
+        if length >= max_chars:
+            break
+
+    return " ".join(sentences[i] for i in sorted(selected))
+
+
+def build_digests(articles, max_chars=DIGEST_MAX_CHARS):
+    article_sentences = {art.get('title'): _article_text(art) for art in articles if art.get('title')}
+
+    document_frequency = Counter()
+    for sentences in article_sentences.values():
+        document_frequency.update({t for s in sentences for t in _tokens(s)})
+    total = len(article_sentences) or 1
+    idf = {t: math.log((1 + total) / (1 + df)) + 1 for t, df in document_frequency.items()}
+
+    return {
+        title: summarize(sentences, idf, max_chars)
+        for title, sentences in article_sentences.items() if sentences
+    }
+
+
+def save_digests(digests, path=DIGESTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(digests, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_digests(path=DIGESTS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
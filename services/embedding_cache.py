@@ -0,0 +1,123 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.parquet")
+TEXT_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+IMAGE_MODEL_ID = "openai/clip-ViT-B/32"
+
+SCHEMA = pa.schema([
+    ("model_id", pa.string()),
+    ("key", pa.string()),
+    ("bytes_hash", pa.string()),
+    ("phash", pa.string()),
+    ("vector", pa.list_(pa.float32())),
+])
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_bytes_hash = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        table = pq.read_table(self.path)
+        vectors = table.column("vector").combine_chunks()
+        offsets = vectors.offsets.to_numpy()
+        values = vectors.values.to_numpy(zero_copy_only=False)
+        model_ids = table.column("model_id").to_pylist()
+        keys = table.column("key").to_pylist()
+        bytes_hashes = table.column("bytes_hash").to_pylist()
+        phashes = table.column("phash").to_pylist()
+
+        for i, key in enumerate(keys):
+            entry = {
+                "bytes_hash": bytes_hashes[i] or "",
+                "phash": phashes[i] or "",
+                "vector": values[offsets[i]:offsets[i + 1]],
+            }
+            self._store(model_ids[i], key, entry)
+        print(f"(EmbeddingCache) Loaded {len(self._entries)} cached vectors from {self.path}")
+
+    def _store(self, model_id, key, entry):
+        self._entries[(model_id, key)] = entry
+        if entry["bytes_hash"]:
+            self._by_bytes_hash[(model_id, entry["bytes_hash"])] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model_id, key):
+        with self._lock:
+            entry = self._entries.get((model_id, key))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get_by_bytes_hash(self, model_id, bytes_hash):
+        with self._lock:
+            return self._by_bytes_hash.get((model_id, bytes_hash))
+
+    def put(self, model_id, key, vector, bytes_hash="", phash=""):
+        entry = {
+            "bytes_hash": bytes_hash,
+            "phash": phash,
+            "vector": np.asarray(vector, dtype=np.float32),
+        }
+        with self._lock:
+            self._store(model_id, key, entry)
+            self._dirty = True
+
+    def vectors(self, model_id):
+        with self._lock:
+            items = [(key, entry["vector"]) for (mid, key), entry in self._entries.items() if mid == model_id]
+        if not items:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        keys, vectors = zip(*items)
+        return list(keys), np.stack(vectors)
+
+    def build_local_index(self, model_id, storage="float32"):
+        from .local_index import LocalVectorIndex
+
+        keys, vectors = self.vectors(model_id)
+        return keys, LocalVectorIndex(vectors, storage=storage)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = list(self._entries.items())
+            table = pa.Table.from_pydict({
+                "model_id": [model_id for (model_id, _), _ in rows],
+                "key": [key for (_, key), _ in rows],
+                "bytes_hash": [entry["bytes_hash"] for _, entry in rows],
+                "phash": [entry["phash"] for _, entry in rows],
+                "vector": [entry["vector"] for _, entry in rows],
+            }, schema=SCHEMA)
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+        print(f"(EmbeddingCache) Saved {len(rows)} vectors to {self.path}")
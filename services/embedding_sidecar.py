@@ -0,0 +1,235 @@
+import os
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from io import BytesIO
+from concurrent.futures import Future
+import numpy as np
+
+DEFAULT_SOCKET_PATH = "/tmp/batch_rag_embeddings.sock"
+MAX_BATCH_SIZE = int(os.getenv("SIDECAR_MAX_BATCH", 64))
+MAX_WAIT_SECONDS = float(os.getenv("SIDECAR_MAX_WAIT_MS", 5)) / 1000
+
+OP_TEXT = 1
+OP_IMAGE = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Request:  op (u8), payload length (u32), payload = count (u32) + count x [length (u32) + bytes]
+# Response: status (u8), rows (u32), dim (u32), rows x dim little-endian float32 (or a UTF-8 error message)
+REQUEST_HEADER = struct.Struct("!BI")
+RESPONSE_HEADER = struct.Struct("!BII")
+LENGTH = struct.Struct("!I")
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Embedding sidecar connection closed.")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def _pack_items(items):
+    parts = [LENGTH.pack(len(items))]
+    for item in items:
+        parts.append(LENGTH.pack(len(item)))
+        parts.append(item)
+    return b"".join(parts)
+
+
+def _unpack_items(payload):
+    (count,) = LENGTH.unpack_from(payload, 0)
+    offset = LENGTH.size
+    items = []
+    for _ in range(count):
+        (size,) = LENGTH.unpack_from(payload, offset)
+        offset += LENGTH.size
+        items.append(payload[offset:offset + size])
+        offset += size
+    return items
+
+
+class EmbeddingClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+            self._local.pid = os.getpid()
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _request(self, op, items):
+        payload = _pack_items(items)
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(REQUEST_HEADER.pack(op, len(payload)) + payload)
+                status, rows, dim = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+                body = _recv_exact(sock, dim if status != STATUS_OK else rows * dim * 4)
+                break
+            except (ConnectionError, OSError):
+                # A timeout or short read leaves unread response bytes on the socket, so it cannot be reused.
+                self._reset()
+                if attempt == 1:
+                    raise
+            except BaseException:
+                self._reset()
+                raise
+
+        if status != STATUS_OK:
+            raise RuntimeError(f"Embedding sidecar error: {body.decode('utf-8')}")
+        return np.frombuffer(body, dtype="<f4").reshape(rows, dim)
+
+    def encode_texts(self, texts) -> np.ndarray:
+        return self._request(OP_TEXT, [t.encode("utf-8") for t in texts])
+
+    def encode_images(self, images_bytes) -> np.ndarray:
+        return self._request(OP_IMAGE, list(images_bytes))
+
+
+class _Batcher:
+    def __init__(self, encoder, max_batch=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, op, items):
+        future = Future()
+        if op not in (OP_TEXT, OP_IMAGE):
+            # _run only drains known ops; anything else would leave the handler waiting forever.
+            future.set_exception(ValueError(f"Unknown opcode {op}."))
+            return future
+        try:
+            # Decoded in the caller's thread, so one bad input fails only its own request, not the batch.
+            inputs = self._decode(op, items)
+        except Exception as e:
+            future.set_exception(ValueError(f"Could not decode input: {e}"))
+            return future
+        self._queue.put((op, inputs, future))
+        return future
+
+    def _decode(self, op, items):
+        if op == OP_TEXT:
+            return [item.decode("utf-8") for item in items]
+        from PIL import Image
+        return [Image.open(BytesIO(item)).convert("RGB") for item in items]
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        size = len(pending[0][1])
+        # max_wait bounds the whole batch from its first request, not each gap between requests.
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[1])
+        return pending
+
+    def _encode(self, op, inputs):
+        if op == OP_TEXT:
+            return self.encoder.encode_texts(inputs)
+        return self.encoder.encode_images(inputs)
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            for op in (OP_TEXT, OP_IMAGE):
+                requests = [r for r in pending if r[0] == op]
+                if not requests:
+                    continue
+                try:
+                    vectors = self._encode(op, [item for _, items, _ in requests for item in items])
+                except Exception as e:
+                    for _, _, future in requests:
+                        future.set_exception(e)
+                    continue
+
+                offset = 0
+                for _, items, future in requests:
+                    future.set_result(vectors[offset:offset + len(items)])
+                    offset += len(items)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                op, size = REQUEST_HEADER.unpack(_recv_exact(self.request, REQUEST_HEADER.size))
+                items = _unpack_items(_recv_exact(self.request, size))
+            except ConnectionError:
+                return
+
+            try:
+                vectors = self.server.batcher.submit(op, items).result()
+                body = np.ascontiguousarray(vectors, dtype="<f4").tobytes()
+                header = RESPONSE_HEADER.pack(STATUS_OK, vectors.shape[0], vectors.shape[1] if vectors.ndim > 1 else 0)
+            except Exception as e:
+                body = str(e).encode("utf-8")
+                header = RESPONSE_HEADER.pack(STATUS_ERROR, 0, len(body))
+            try:
+                self.request.sendall(header + body)
+            except OSError:
+                # The client timed out and dropped the connection; it reconnects on its next request.
+                return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path, encoder):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.batcher = _Batcher(encoder)
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, with_vision=False):
+    from . import clip_text_encoder
+
+    encoder = clip_text_encoder.load_local_encoder(os.getenv("CLIP_TEXT_ENCODER_PATH"), with_vision=with_vision)
+    server = EmbeddingServer(socket_path, encoder)
+    print(f"(Sidecar) {encoder.description} serving on '{socket_path}' "
+          f"(batch <= {MAX_BATCH_SIZE}, wait <= {MAX_WAIT_SECONDS * 1000:g} ms).")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared CLIP embedding sidecar.")
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_SIDECAR_SOCKET", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--with-vision", action="store_true", help="Also load the CLIP vision tower for image requests")
+    args = parser.parse_args()
+    serve(args.socket, with_vision=args.with_vision)
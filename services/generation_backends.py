@@ -0,0 +1,304 @@
+import os
+import time
+import threading
+import datetime
+from abc import ABC, abstractmethod
+from collections import Counter
+
+CACHE_TTL_SECONDS = int(os.getenv("GEN_CACHE_TTL_SECONDS", 3600))
+CACHE_REBUILD_SECONDS = int(os.getenv("GEN_CACHE_REBUILD_SECONDS", 600))
+CACHE_FAILURE_BACKOFF_SECONDS = int(os.getenv("GEN_CACHE_FAILURE_BACKOFF_SECONDS", 900))
+HOT_ARTICLE_COUNT = int(os.getenv("GEN_CACHE_HOT_ARTICLES", 12))
+HOT_MIN_USES = int(os.getenv("GEN_CACHE_MIN_USES", 2))
+EXPIRY_MARGIN_SECONDS = 60
+MAX_TRACKED_ARTICLES = 500
+
+
+class CachedContextUnavailable(RuntimeError):
+    pass
+
+
+class InlineBackend:
+    """Sends the instructions and every article inline with each request."""
+    name = "inline"
+    needs_model = True
+
+    def __init__(self, model_getter, instructions):
+        self.model_getter = model_getter
+        self.instructions = instructions
+        self.requests = 0
+        self.input_chars = 0
+
+    def lease(self, payloads, epoch=None):
+        return None, set()
+
+    def _count(self, parts):
+        self.requests += 1
+        self.input_chars += sum(len(p) for p in parts if isinstance(p, str))
+
+    def generate(self, parts, handle=None):
+        parts = [self.instructions] + list(parts)
+        self._count(parts)
+        return self.model_getter().generate_content(parts).text
+
+    def stats(self):
+        return {"backend": self.name, "requests": self.requests, "input_chars": self.input_chars}
+
+
+class ContextCachingBackend(InlineBackend, ABC):
+    """Keeps the instructions and the hottest articles in one provider-side cached context.
+
+    Requests whose candidates are in the cache refer to them by title instead of re-sending them.
+    Provider caches are rebuilt in the background as the hot set drifts or the TTL runs out,
+    and a replaced cache is deleted one rebuild later so in-flight requests can still use it.
+    A new corpus epoch drops every cached article, since its text may have changed on reload.
+    """
+    name = "cached"
+
+    def __init__(self, model_getter, instructions, render, ttl=CACHE_TTL_SECONDS,
+                 rebuild_interval=CACHE_REBUILD_SECONDS, hot_count=HOT_ARTICLE_COUNT,
+                 min_uses=HOT_MIN_USES, background=True):
+        super().__init__(model_getter, instructions)
+        self.render = render
+        self.ttl = ttl
+        self.rebuild_interval = rebuild_interval
+        self.hot_count = hot_count
+        self.min_uses = min_uses
+        self.background = background
+
+        self._lock = threading.Lock()
+        self._uses = Counter()
+        self._payloads = {}
+        self._handle = None
+        self._handle_titles = frozenset()
+        self._expires_at = 0.0
+        self._retired = None
+        self._last_build = float("-inf")
+        self._retry_after = 0.0
+        self._building = False
+        self._epoch = None
+        self._old_epochs = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.build_failures = 0
+        self.fallbacks = 0
+
+    def _hot_titles(self):
+        return [t for t, n in self._uses.most_common(self.hot_count) if n >= self.min_uses and t in self._payloads]
+
+    def _needs_rebuild(self, now, live):
+        if self._building or now < self._retry_after:
+            return False
+        hot = self._hot_titles()
+        if not hot:
+            return False
+        if not live:
+            return True
+        expiring = now > self._expires_at - self.ttl * 0.1
+        drifted = not set(hot) <= self._handle_titles
+        return (expiring or drifted) and now - self._last_build >= self.rebuild_interval
+
+    def _switch_epoch(self, epoch):
+        # Called under self._lock. Returns a handle that is no longer referenced and can be deleted.
+        self._old_epochs.add(self._epoch)
+        self._epoch = epoch
+        self._uses = Counter()
+        self._payloads = {}
+        stale = None
+        if self._handle is not None:
+            stale, self._retired = self._retired, self._handle
+        self._handle = None
+        self._handle_titles = frozenset()
+        self._last_build = float("-inf")
+        return stale
+
+    def lease(self, payloads, epoch=None):
+        now = time.monotonic()
+        stale = None
+        with self._lock:
+            if epoch in self._old_epochs:
+                # A request that started before a reload: its articles may be outdated, so do not track them.
+                self.misses += len(payloads)
+                return None, set()
+            if epoch != self._epoch:
+                stale = self._switch_epoch(epoch)
+            for payload in payloads:
+                self._uses[payload['title']] += 1
+                self._payloads[payload['title']] = payload
+            if len(self._payloads) > MAX_TRACKED_ARTICLES:
+                keep = {t for t, _ in self._uses.most_common(MAX_TRACKED_ARTICLES // 2)}
+                self._payloads = {t: p for t, p in self._payloads.items() if t in keep}
+                self._uses = Counter({t: n for t, n in self._uses.items() if t in keep})
+
+            live = self._handle is not None and now < self._expires_at - EXPIRY_MARGIN_SECONDS
+            handle = self._handle if live else None
+            hits = {p['title'] for p in payloads if live and p['title'] in self._handle_titles}
+            self.hits += len(hits)
+            self.misses += len(payloads) - len(hits)
+
+            rebuild = self._needs_rebuild(now, live)
+            if rebuild:
+                self._building = True
+
+        if stale is not None:
+            self._delete(stale)
+        if rebuild:
+            if self.background:
+                threading.Thread(target=self._rebuild, name="gen-context-cache", daemon=True).start()
+            else:
+                self._rebuild()
+        return handle, hits
+
+    def _rebuild(self):
+        with self._lock:
+            epoch = self._epoch
+            titles = self._hot_titles()
+            payloads = [self._payloads[t] for t in titles]
+        try:
+            contents = []
+            for payload in payloads:
+                contents.extend(self.render(payload))
+            handle = self._create(contents)
+        except Exception as e:
+            print(f"(Generation) Could not build cached context, sending content inline: {e}")
+            with self._lock:
+                self.build_failures += 1
+                self._retry_after = time.monotonic() + CACHE_FAILURE_BACKOFF_SECONDS
+                self._building = False
+            return
+
+        with self._lock:
+            outdated = epoch != self._epoch
+            self._building = False
+            if not outdated:
+                stale, self._retired = self._retired, self._handle
+                self._handle = handle
+                self._handle_titles = frozenset(titles)
+                self._expires_at = time.monotonic() + self.ttl
+                self._last_build = time.monotonic()
+                self.builds += 1
+        if outdated:
+            # The corpus reloaded while this cache was being built, so its articles may be out of date.
+            self._delete(handle)
+            return
+        print(f"(Generation) Cached context rebuilt with {len(titles)} hot articles (TTL {self.ttl}s).")
+        if stale is not None:
+            self._delete(stale)
+
+    def invalidate(self, handle):
+        with self._lock:
+            if self._handle is handle:
+                self._handle = None
+                self._handle_titles = frozenset()
+
+    def generate(self, parts, handle=None):
+        if handle is None:
+            return super().generate(parts)
+        self._count(parts)
+        try:
+            return self._generate_cached(handle, parts)
+        except CachedContextUnavailable:
+            self.invalidate(handle)
+            self.fallbacks += 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                **super().stats(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "builds": self.builds,
+                "build_failures": self.build_failures,
+                "fallbacks": self.fallbacks,
+                "cached_articles": len(self._handle_titles) if self._handle is not None else 0,
+            }
+
+    @abstractmethod
+    def _create(self, contents):
+        """Creates a provider-side cache of the instructions plus contents and returns its handle."""
+
+    @abstractmethod
+    def _generate_cached(self, handle, parts):
+        """Generates against a cache handle; raises CachedContextUnavailable if the provider dropped it."""
+
+    def _delete(self, handle):
+        pass
+
+
+class GeminiCachedBackend(ContextCachingBackend):
+    name = "gemini-cached"
+
+    def __init__(self, model_getter, instructions, render, **kwargs):
+        super().__init__(model_getter, instructions, render, **kwargs)
+        self._models = {}
+
+    def _create(self, contents):
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=self.model_getter().model_name,
+            display_name="batch-rag-hot-articles",
+            system_instruction=self.instructions,
+            contents=contents,
+            ttl=datetime.timedelta(seconds=self.ttl),
+        )
+
+    def _generate_cached(self, handle, parts):
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        model = self._models.get(handle.name)
+        if model is None:
+            model = self._models[handle.name] = genai.GenerativeModel.from_cached_content(cached_content=handle)
+        try:
+            return model.generate_content(list(parts)).text
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+            raise CachedContextUnavailable(str(e)) from e
+
+    def _delete(self, handle):
+        self._models.pop(handle.name, None)
+        try:
+            handle.delete()
+        except Exception as e:
+            print(f"(Generation) Could not delete cached context {handle.name}: {e}")
+
+
+class StubBackend(ContextCachingBackend):
+    """No network: records what would be sent, for testing cache hit and miss behaviour."""
+    name = "stub"
+    needs_model = False
+
+    def __init__(self, instructions, render=None, **kwargs):
+        kwargs.setdefault("background", False)
+        super().__init__(None, instructions, render or (lambda payload: [payload.get('text', '')]), **kwargs)
+        self.cached_chars = 0
+        self.expire_next = False
+
+    def _create(self, contents):
+        self.cached_chars = len(self.instructions) + sum(len(c) for c in contents if isinstance(c, str))
+        return {"id": self.builds + 1}
+
+    def _generate_cached(self, handle, parts):
+        if self.expire_next:
+            self.expire_next = False
+            raise CachedContextUnavailable("stub cache expired")
+        return f"Stub answer (cached context {handle['id']})"
+
+    def generate(self, parts, handle=None):
+        if handle is None:
+            self._count([self.instructions] + list(parts))
+            return "Stub answer (inline)"
+        return super().generate(parts, handle)
+
+
+def create_backend(name, model_getter, instructions, render):
+    if name == "inline":
+        return InlineBackend(model_getter, instructions)
+    if name == "stub":
+        return StubBackend(instructions, render)
+    if name == "gemini-cached":
+        return GeminiCachedBackend(model_getter, instructions, render)
+    raise ValueError(f"Unknown generation backend '{name}', expected gemini-cached, inline or stub.")
@@ -6,15 +6,40 @@ from io import BytesIO
 import google.generativeai as genai
 from dotenv import load_dotenv
 from google.api_core import exceptions as google_exceptions
+from services.generation_backends import create_backend, CachedContextUnavailable
 
 load_dotenv(override=True)
 
+PROMPT_VERSION = "ranking-v4-context-cache"
+GEN_BACKEND = os.getenv("GEN_BACKEND", "inline")
+FULL_TEXT_TOP_N = int(os.getenv("GEN_FULL_TEXT_TOP_N", 2))
+FULL_TEXT_MAX_CHARS = 6000
+QUOTA_EXCEEDED_MESSAGE = "System is currently overloaded (Google API Quota exceeded). Please try again in a few minutes."
+
+STATIC_INSTRUCTIONS = """
+    You are an intelligent news analyst for 'The Batch'.
+    
+    YOUR TASK:
+    1. Analyze the provided "CANDIDATE ARTICLES" (text and images) for the USER QUERY given with them.
+    2. Select the most relevant information.
+    3. **PRIORITY**: Relevance > Recency > Visual Evidence.
+    4. Synthesize an answer based *only* on the provided sources.
+    5. Cite sources by title. Use Markdown.
+    
+    Some candidates point to a REFERENCE ARTICLE of the same title instead of repeating its content;
+    use that reference article's text and image for them. Ignore reference articles that no candidate points to.
+    """
+
 api_key = os.getenv("GEMINI_API_KEY")
 gemini_model = None
 
-if not api_key:
-    print("Error: GEMINI_API_KEY not found in .env file.")
-else:
+def configure():
+    global gemini_model
+
+    if not api_key:
+        print("Error: GEMINI_API_KEY not found in .env file.")
+        return
+
     try:
         genai.configure(api_key=api_key)
         all_models = [m.name for m in genai.list_models()]
@@ -32,6 +57,9 @@ else:
     except Exception as e:
         print(f"Error initializing Gemini: {e}")
 
+if os.getenv("BATCH_RAG_DEFER_CONNECT") != "1":
+    configure()
+
 def _download_image(url):
     if not url: return None
     try:
@@ -47,66 +75,116 @@ def _download_image(url):
     except Exception:
         return None
 
-def generate_answer_with_ranking(query, candidates):
-    if not gemini_model:
-        raise ConnectionError("Gemini model is not initialized.")
+def _render_reference_article(payload):
+    parts = [f"""
+    === REFERENCE ARTICLE: {payload['title']} ===
+    Date: {payload['date']}
+    Content: {payload['text']}
+    """]
+    img_obj = _download_image(payload.get('image_url'))
+    if img_obj:
+        parts.append(f"Image belonging to reference article '{payload['title']}':")
+        parts.append(img_obj)
+    return parts
 
-    if not candidates:
-        return "I couldn't find any relevant articles.", []
+backend = create_backend(GEN_BACKEND, lambda: gemini_model, STATIC_INSTRUCTIONS, _render_reference_article)
 
-    prompt_parts = []
-    
-    system_prompt = f"""
-    You are an intelligent news analyst for 'The Batch'.
-    USER QUERY: "{query}"
-    
-    YOUR TASK:
-    1. Analyze the provided "CANDIDATE ARTICLES" (text and images).
-    2. Select the most relevant information.
-    3. **PRIORITY**: Relevance > Recency > Visual Evidence.
-    4. Synthesize an answer based *only* on the provided sources.
-    5. Cite sources by title. Use Markdown.
-    """
-    prompt_parts.append(system_prompt)
-    prompt_parts.append("\n=== CANDIDATE ARTICLES START ===\n")
+def _article_payload(art):
+    return {
+        'title': art['title'],
+        'date': str(art.get('date', 'Unknown'))[:10],
+        'text': art['content'][:FULL_TEXT_MAX_CHARS],
+        'image_url': art.get('image_url'),
+    }
+
+def _full_text_indexes(candidates):
+    ranked = sorted(range(len(candidates)), key=lambda i: candidates[i].get('score') or 0, reverse=True)
+    return set(ranked[:FULL_TEXT_TOP_N])
+
+def _candidate_text(art, full_text):
+    if full_text or not art.get('digest'):
+        return "Content", art['content'][:FULL_TEXT_MAX_CHARS]
+    return "Summary", art['digest']
+
+def candidate_contexts(candidates):
+    """Returns the article text the model is given for each candidate (full text or digest)."""
+    full_text_indexes = _full_text_indexes(candidates)
+    return [_candidate_text(art, i in full_text_indexes)[1] for i, art in enumerate(candidates)]
+
+def _build_prompt_parts(query, candidates, cached_titles):
+    prompt_parts = [f'\nUSER QUERY: "{query}"\n', "\n=== CANDIDATE ARTICLES START ===\n"]
+
+    attached_images = {}
+    full_text_indexes = _full_text_indexes(candidates)
 
     for i, art in enumerate(candidates):
         date_str = str(art.get('date', 'Unknown'))[:10]
-        content_preview = art['content'][:6000]
+        cached = art['title'] in cached_titles
+        if cached:
+            content_label, content_preview = "Content", "see the reference article with this title"
+        else:
+            content_label, content_preview = _candidate_text(art, i in full_text_indexes)
         
         article_text = f"""
         --- ARTICLE {i+1} ---
         Title: {art['title']}
         Date: {date_str}
         Found via: {art.get('source_type', 'text search')}
-        Content: {content_preview}
+        {content_label}: {content_preview}
         """
         prompt_parts.append(article_text)
         
-        if art.get('image_url'):
-            img_obj = _download_image(art['image_url'])
+        image_url = art.get('image_url')
+        if cached:
+            continue
+        if image_url in attached_images:
+            prompt_parts.append(f"Article {i+1} uses the same image as Article {attached_images[image_url]}.")
+        elif image_url:
+            img_obj = _download_image(image_url)
             if img_obj:
+                attached_images[image_url] = i + 1
                 prompt_parts.append(f"Image belonging to Article {i+1}:")
                 prompt_parts.append(img_obj)
     
     prompt_parts.append("\n=== CANDIDATE ARTICLES END ===\n")
     prompt_parts.append("\nYOUR ANALYSIS AND ANSWER (in Markdown):")
+    return prompt_parts
 
-    max_retries = 3
+def generate_answer_with_ranking(query, candidates, corpus_epoch=None, limiter=None):
+    # With a shared limiter, every attempt takes a slot and a 429 pushes back all callers instead of sleeping here.
+    if backend.needs_model and not gemini_model:
+        raise ConnectionError("Gemini model is not initialized.")
+
+    if not candidates:
+        return "I couldn't find any relevant articles.", []
+
+    handle, cached_titles = backend.lease([_article_payload(art) for art in candidates], corpus_epoch)
+    prompt_parts = _build_prompt_parts(query, candidates, cached_titles)
+
+    attempt, max_retries = 0, 3
     
-    for attempt in range(max_retries):
+    while attempt < max_retries:
+        if limiter is not None:
+            limiter.acquire()
         try:
-            response = gemini_model.generate_content(prompt_parts)
-            return response.text, [] 
+            return backend.generate(prompt_parts, handle), []
+
+        except CachedContextUnavailable as e:
+            print(f"(Generation) Cached context unavailable, sending content inline: {e}")
+            handle = None
+            prompt_parts = _build_prompt_parts(query, candidates, set())
 
         except google_exceptions.ResourceExhausted:
-            wait_time = 20 * (attempt + 1) 
+            attempt += 1
+            wait_time = 20 * attempt
             print(f"Quota exceeded (429). Waiting {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
-            continue 
+            if limiter is not None:
+                limiter.backoff(wait_time)
+            else:
+                time.sleep(wait_time)
             
         except Exception as e:
             print(f"Error generating content: {e}")
             return f"Error: {e}", []
 
-    return "System is currently overloaded (Google API Quota exceeded). Please try again in a few minutes.", []
\ No newline at end of file
+    return QUOTA_EXCEEDED_MESSAGE, []
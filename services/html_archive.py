@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+import zstandard as zstd
+
+DEFAULT_ARCHIVE_PATH = os.getenv("HTML_ARCHIVE_PATH", "data/raw/html_archive.zst")
+COMPRESSION_LEVEL = int(os.getenv("HTML_ARCHIVE_LEVEL", 10))
+
+
+class HtmlArchive:
+    # Append-only: every page is an independent zstd frame in one data file, and a JSONL index maps
+    # issue_id -> (offset, length). Re-fetching an issue appends a new frame; the newest index line wins.
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH, index=None):
+        self.path = path
+        self.index_path = f"{path}.index.jsonl"
+        self._lock = threading.Lock()
+        self._index = {}
+        self._decompressor = threading.local()
+        self._tail_checked = False
+
+        if index is not None:
+            # A snapshot taken by another process (e.g. the reprocess pool's parent); nothing is read or logged.
+            self._index = dict(index)
+        elif os.path.exists(self.index_path):
+            self._load_index()
+
+    def _load_index(self):
+        data_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line torn by a crash mid-append; the frame it points to is simply unreferenced.
+                    continue
+                if entry["offset"] + entry["length"] <= data_size:
+                    self._index[entry["issue_id"]] = entry
+
+        print(f"(HtmlArchive) Indexed {len(self._index)} archived pages in {self.path}")
+
+    def _repair_index_tail(self):
+        # Only writers call this (under self._lock), so read-only reprocess workers never touch the index.
+        # A crash mid-append can leave the last line without its newline; the next entry must not join it.
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+        self._tail_checked = True
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, issue_id):
+        return issue_id in self._index
+
+    def issue_ids(self):
+        return sorted(self._index, reverse=True)
+
+    def entry(self, issue_id):
+        return self._index.get(issue_id)
+
+    def index_snapshot(self):
+        return dict(self._index)
+
+    def append(self, issue_id, url, html, fetched_at=None):
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+        digest = hashlib.sha256(html).hexdigest()
+
+        with self._lock:
+            current = self._index.get(issue_id)
+            if current and current["sha256"] == digest:
+                return current
+
+            if not self._tail_checked:
+                self._repair_index_tail()
+            frame = zstd.ZstdCompressor(level=COMPRESSION_LEVEL).compress(html)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(frame)
+                f.flush()
+                os.fsync(f.fileno())
+
+            entry = {
+                "issue_id": issue_id,
+                "url": url,
+                "offset": offset,
+                "length": len(frame),
+                "raw_size": len(html),
+                "sha256": digest,
+                "fetched_at": fetched_at or datetime.now().isoformat(),
+            }
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._index[issue_id] = entry
+            return entry
+
+    def read(self, issue_id) -> bytes:
+        entry = self._index.get(issue_id)
+        if entry is None:
+            raise KeyError(f"Issue {issue_id} is not in the archive.")
+
+        with open(self.path, "rb") as f:
+            f.seek(entry["offset"])
+            frame = f.read(entry["length"])
+
+        decompressor = getattr(self._decompressor, "value", None)
+        if decompressor is None:
+            decompressor = self._decompressor.value = zstd.ZstdDecompressor()
+        html = decompressor.decompress(frame)
+        if hashlib.sha256(html).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Archived page for issue {issue_id} is corrupted.")
+        return html
@@ -0,0 +1,74 @@
+import numpy as np
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+BLOCK_SIZE = 4096
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorIndex:
+    def __init__(self, vectors, storage: str = "float32", rerank_path: str = None):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type '{storage}', expected one of {STORAGE_TYPES}.")
+
+        vectors = _normalize(vectors)
+        self.storage = storage
+        self.dim = vectors.shape[1]
+        self.scales = None
+
+        if storage == "float16":
+            self.vectors = vectors.astype(np.float16)
+        elif storage == "int8":
+            self.scales = np.abs(vectors).max(axis=1) / 127.0
+            self.scales[self.scales == 0] = 1.0
+            self.vectors = np.round(vectors / self.scales[:, None]).astype(np.int8)
+            self.scales = self.scales.astype(np.float32)
+        else:
+            self.vectors = vectors
+
+        self.rerank_vectors = None
+        if rerank_path and storage != "float32":
+            np.save(rerank_path, vectors)
+            self.rerank_vectors = np.load(rerank_path, mmap_mode="r")
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def memory_bytes(self) -> int:
+        scales_bytes = self.scales.nbytes if self.scales is not None else 0
+        return self.vectors.nbytes + scales_bytes
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.storage == "float32":
+            return self.vectors @ query
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_SIZE):
+            block = self.vectors[start:start + BLOCK_SIZE].astype(np.float32)
+            scores[start:start + BLOCK_SIZE] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query, k: int = 10, shortlist: int = None) -> tuple:
+        query = _normalize(query)
+        scores = self._approximate_scores(query)
+
+        if shortlist and self.rerank_vectors is not None and shortlist > k:
+            candidate_count = min(shortlist, len(self))
+            candidates = np.argpartition(-scores, candidate_count - 1)[:candidate_count]
+            candidates.sort()
+            exact_scores = np.asarray(self.rerank_vectors[candidates]) @ query
+            order = np.argsort(-exact_scores)[:k]
+            return candidates[order], exact_scores[order]
+
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        order = top[np.argsort(-scores[top])]
+        return order, scores[order]
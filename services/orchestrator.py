@@ -1,108 +1,351 @@
 from . import retrieval_service
 from . import generation_service 
-import json
+from . import corpus
+from . import query_log
+from . import answer_cache
+from .query_dates import infer_date_range, in_date_range
+from .singleflight import SingleFlight
+from .resilience import Deadline, DeadlineExceeded, CircuitOpenError
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 4))
+TEXT_ARTICLE_LIMIT = 8
+CHUNKS_PER_ARTICLE = 2
+RETRIEVAL_DEADLINE_SECONDS = float(os.getenv("RETRIEVAL_DEADLINE_SECONDS", 8))
+MAX_CANDIDATES = 6
+ADAPTIVE_CUTOFF = os.getenv("CANDIDATE_CUTOFF", "0") == "1"
+CUTOFF_RELATIVE_THRESHOLD = float(os.getenv("CUTOFF_RELATIVE_THRESHOLD", 0.6))
+CUTOFF_SCORE_GAP = float(os.getenv("CUTOFF_SCORE_GAP", 0.2))
+CUTOFF_MIN_CANDIDATES = int(os.getenv("CUTOFF_MIN_CANDIDATES", 1))
+CORPUS_REFRESH_SECONDS = float(os.getenv("CORPUS_REFRESH_SECONDS", 30))
+
+_in_flight = SingleFlight()
+
+_corpus_signature = corpus.signature()
 try:
-    with open("data/processed/news_articles.json", "r", encoding="utf-8") as f:
-        articles_data = json.load(f)
-    
-    ARTICLES_DB = {}
-    for art in articles_data:
-        full_text = "\n\n".join(art.get('chunks', []))
-        
-        date_val = art.get('issue_date') or art.get('date') or '1970-01-01'
-        
-        ARTICLES_DB[art.get('title')] = {
-            'content': full_text,
-            'date': date_val,
-            'url': art.get('issue_url') or art.get('url')
-        }
-        
+    ARTICLES_DB = corpus.load_articles()
     print(f"(Orchestrator) Loaded DB for {len(ARTICLES_DB)} articles.")
 except Exception as e:
     print(f"(Orchestrator) Error loading JSON: {e}")
     ARTICLES_DB = {}
+CORPUS_EPOCH = corpus.epoch(_corpus_signature)
+
+def reload_corpus(corpus_signature):
+    global ARTICLES_DB, CORPUS_EPOCH
+    articles_db = corpus.load_articles()
+    # The store is swapped before the epoch, so a request keyed by the new epoch never reads the old store.
+    ARTICLES_DB = articles_db
+    CORPUS_EPOCH = corpus.epoch(corpus_signature)
+    print(f"(Orchestrator) Reloaded DB for {len(articles_db)} articles (epoch {CORPUS_EPOCH}).")
+
+_refresher = corpus.CorpusRefresher(reload_corpus, CORPUS_REFRESH_SECONDS, _corpus_signature)
+
+def start_corpus_refresher():
+    _refresher.start()
+
+if not retrieval_service.DEFER_CONNECT:
+    start_corpus_refresher()
+
+def normalize_query(user_query):
+    return " ".join(user_query.split()).lower()
+
+def _degradation_reason(error):
+    if isinstance(error, DeadlineExceeded):
+        return 'deadline_exceeded'
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    return 'error'
+
+def _has_text(chunks):
+    return any((c.get('content') or '').strip() for c in chunks)
 
-def get_rag_response(user_query):
-    all_candidates_map = {}
+def _candidate_refs(user_query, clip_vector, deadline, degraded, date_range, articles_db):
+    # Candidates stay lightweight references until ranking is done; content is attached by hydrate_candidates.
+    refs = {}
+    fallback_chunks = {}
     gallery_images = []
 
     try:
-        text_results = retrieval_service.search_text_chunks(user_query, limit=15)
+        article_groups = retrieval_service.search_articles(
+            user_query, num_articles=TEXT_ARTICLE_LIMIT, chunks_per_article=CHUNKS_PER_ARTICLE, deadline=deadline,
+            **date_range
+        )
+    except Exception as e:
+        print(f"(Orchestrator) Text retrieval degraded: {e}")
+        degraded['text'] = _degradation_reason(e)
+        article_groups = []
+    
+    for group in article_groups:
+        title = group['news_title']
+        chunk = group['chunks'][0]
         
-        for chunk in text_results:
-            title = chunk.get('news_title')
+        if title not in refs:
+            db_entry = articles_db.get(title)
             
-            if title and title not in all_candidates_map:
-                db_entry = ARTICLES_DB.get(title)
-                
-                if db_entry:
-                    content = db_entry['content']
-                    date = db_entry['date']
-                else:
-                    content = chunk.get('content')
-                    date = chunk.get('issue_date', '1970-01-01')
-
-                if content:
-                    article_obj = {
-                        'title': title,
-                        'date': date, 
-                        'content': content,
-                        'url': chunk.get('issue_url'),
-                        'image_url': chunk.get('image_url'),
-                        'source_type': 'text_match'
-                    }
-                    all_candidates_map[title] = article_obj
-
-        image_results = retrieval_service.search_images_by_text(user_query, limit=5)
+            if db_entry:
+                if not db_entry['content']:
+                    continue
+                news_id, date = db_entry.get('news_id'), db_entry['date']
+            else:
+                if not _has_text(group['chunks']):
+                    continue
+                news_id, date = None, chunk.get('issue_date', '1970-01-01')
+                fallback_chunks[title] = group['chunks']
+
+            refs[title] = {
+                'title': title,
+                'news_id': news_id,
+                'date': date, 
+                'url': chunk.get('issue_url'),
+                'image_url': chunk.get('image_url'),
+                'score': group['score'],
+                'explain_score': group.get('explain_score'),
+                'source_type': 'text_match'
+            }
+
+    try:
+        image_results = retrieval_service.search_images_by_text(
+            user_query, limit=5, query_vector=clip_vector, deadline=deadline, **date_range
+        )
+    except Exception as e:
+        print(f"(Orchestrator) Image retrieval degraded: {e}")
+        degraded['images'] = _degradation_reason(e)
+        image_results = []
+    
+    seen_hashes = set()
+    
+    for img in image_results:
+        image_key = img.get('image_phash') or img.get('image_url')
         
-        for img in image_results:
-            title = img.get('news_title')
+        if img.get('image_url') and image_key not in seen_hashes:
+            seen_hashes.add(image_key)
+            gallery_obj = {
+                'title': img.get('news_title'),
+                'url': img.get('issue_url'),
+                'image_url': img.get('image_url'),
+                'type': 'CLIP'
+            }
+            gallery_images.append(gallery_obj)
+
+        titles = img.get('news_titles') or [img.get('news_title')]
+        issue_urls = img.get('issue_urls') or [img.get('issue_url')]
+
+        for title, issue_url in zip(titles, issue_urls):
+            if not title:
+                continue
+
+            db_entry = articles_db.get(title)
             
-            if img.get('image_url'):
-                gallery_obj = {
+            if db_entry and title not in refs and in_date_range(db_entry['date'], date_range):
+                refs[title] = {
                     'title': title,
-                    'url': img.get('issue_url'),
+                    'news_id': db_entry.get('news_id'),
+                    'date': db_entry['date'], 
+                    'url': issue_url,
                     'image_url': img.get('image_url'),
-                    'type': 'CLIP'
+                    'score': img.get('score'),
+                    'explain_score': img.get('explain_score'),
+                    'source_type': 'image_match' 
                 }
-                gallery_images.append(gallery_obj)
-
-            if title:
-                db_entry = ARTICLES_DB.get(title)
-                
-                if db_entry and title not in all_candidates_map:
-                    article_obj = {
-                        'title': title,
-                        'date': db_entry['date'], 
-                        'content': db_entry['content'],
-                        'url': img.get('issue_url'),
-                        'image_url': img.get('image_url'),
-                        'source_type': 'image_match' 
-                    }
-                    all_candidates_map[title] = article_obj
-                    print(f"INFO: Added '{title}' via Image Search (Date: {db_entry['date']})")
+                print(f"INFO: Added '{title}' via Image Search (Date: {db_entry['date']})")
+
+    return list(refs.values()), gallery_images, fallback_chunks
 
+def hydrate_candidates(refs, articles_db, fallback_chunks=None):
+    fallback_chunks = fallback_chunks or {}
+    candidates = []
+    for ref in refs:
+        db_entry = articles_db.get(ref['title'])
+        if db_entry:
+            content, digest = db_entry['content'], db_entry.get('digest')
+        else:
+            chunks = fallback_chunks.get(ref['title'], [])
+            content, digest = "\n\n".join(c.get('content') or '' for c in chunks).strip(), None
+        candidates.append({**ref, 'content': content, 'digest': digest})
+    return candidates
+
+def rank_candidates(refs):
+    if ADAPTIVE_CUTOFF:
+        refs = select_candidates(refs)
+    refs = sorted(refs, key=lambda x: str(x.get('date', ''))[:10], reverse=True)
+    return refs[:MAX_CANDIDATES]
+
+def retrieve_candidates(user_query, clip_vector=None, deadline=None, degraded=None, date_range=None):
+    if degraded is None:
+        degraded = {}
+    if date_range is None:
+        date_range = infer_date_range(user_query)
+    # One snapshot for both phases, so a hot reload between them cannot mix two stores.
+    articles_db = ARTICLES_DB
+    refs, gallery_images, fallback_chunks = _candidate_refs(
+        user_query, clip_vector, deadline, degraded, date_range, articles_db
+    )
+    top_refs = rank_candidates(refs)
+    return hydrate_candidates(top_refs, articles_db, fallback_chunks), gallery_images[:4]
+
+def _relative_scores(candidates):
+    # Text and image scores come from separate hybrid queries with their own fusion normalization,
+    # so each source is scaled by its own best hit before the two are compared.
+    best = {}
+    for c in candidates:
+        source = c.get('source_type')
+        best[source] = max(best.get(source, 0.0), c.get('score') or 0.0)
+    return [
+        (c.get('score') or 0.0) / best[c.get('source_type')] if best[c.get('source_type')] > 0 else 0.0
+        for c in candidates
+    ]
+
+def select_candidates(candidates, max_keep=MAX_CANDIDATES, min_keep=CUTOFF_MIN_CANDIDATES,
+                      relative_threshold=CUTOFF_RELATIVE_THRESHOLD, score_gap=CUTOFF_SCORE_GAP):
+    ranked = sorted(zip(_relative_scores(candidates), candidates), key=lambda pair: pair[0], reverse=True)
+    if not ranked or ranked[0][0] <= 0:
+        return [c for _, c in ranked[:max_keep]]
+
+    kept = ranked[:1]
+    for score, candidate in ranked[1:max_keep]:
+        # Stop below a fraction of the best score, or at the first large drop between neighbours.
+        if len(kept) >= min_keep and (score < relative_threshold or kept[-1][0] - score > score_gap):
+            break
+        kept.append((score, candidate))
+    return [c for _, c in kept]
+
+def get_coalesced_count():
+    return _in_flight.coalesced
+
+def _query_key(user_query):
+    return (
+        normalize_query(user_query),
+        TEXT_ARTICLE_LIMIT,
+        CHUNKS_PER_ARTICLE,
+        generation_service.PROMPT_VERSION,
+        CORPUS_EPOCH,
+        tuple(infer_date_range(user_query).values()),
+    )
+
+def _cacheable(result):
+    answer = result['answer']
+    return (
+        bool(result['sources'])
+        and not result['meta']['degraded']
+        and not answer.startswith(("Error:", "Gen Error:"))
+        and answer != generation_service.QUOTA_EXCEEDED_MESSAGE
+    )
+
+def _compact(result, articles_db):
+    # Article bodies stay out of the answer cache; sources found in the store are rehydrated by title.
+    sources = [
+        {k: v for k, v in src.items() if k not in ('content', 'digest')} if src.get('title') in articles_db else src
+        for src in result['sources']
+    ]
+    return {**result, 'sources': sources}
+
+def _rehydrate(result, articles_db):
+    sources = []
+    for src in result['sources']:
+        if 'content' not in src:
+            db_entry = articles_db.get(src.get('title')) or {}
+            src = {**src, 'content': db_entry.get('content', ''), 'digest': db_entry.get('digest')}
+        sources.append(src)
+    return {**result, 'sources': sources}
+
+def _run_and_store(query_key, user_query, clip_vector=None, warmed=False):
+    result = _run_query(user_query, clip_vector)
+    if _cacheable(result):
+        answer_cache.put(query_key, _compact(result, ARTICLES_DB), warmed=warmed)
+    return result
+
+def run_query(user_query, clip_vector=None, source=None):
+    start = time.perf_counter()
+    key = _query_key(user_query)
+    entry = answer_cache.get(key)
+    if entry is not None:
+        result, cache = _rehydrate(entry['result'], ARTICLES_DB), 'hit'
+    else:
+        result, coalesced = _in_flight.do_with_status(key, _run_and_store, key, user_query, clip_vector)
+        cache = 'coalesced' if coalesced else 'miss'
+    warmed = entry is not None and entry['warmed']
+    if source != 'replay':
+        answer_cache.record_lookup(key[4], hit=entry is not None, warmed=warmed)
+    query_log.record(
+        normalize_query(user_query), result, cache, (time.perf_counter() - start) * 1000,
+        source=source, epoch=key[4],
+    )
+    # Coalesced callers share one result dict, so the per-caller cache outcome goes on a copy.
+    meta = {**result['meta'], 'cache': cache}
+    if warmed:
+        meta['warmed'] = True
+    return {**result, 'meta': meta}
+
+def prewarm(user_query):
+    """Answers a query ahead of traffic and stores it in the answer cache; returns 'cached', 'warmed' or 'skipped'."""
+    key = _query_key(user_query)
+    if answer_cache.get(key) is not None:
+        return 'cached'
+    result, _ = _in_flight.do_with_status(key, _run_and_store, key, user_query, None, True)
+    if not _cacheable(result):
+        return 'skipped'
+    answer_cache.count_warmed(key[4])
+    return 'warmed'
+
+def _run_query(user_query, clip_vector=None):
+    # Read before retrieval: the store is swapped first on reload, so it is never older than this epoch.
+    corpus_epoch = CORPUS_EPOCH
+    degraded = {}
+    timings = {}
+    date_range = infer_date_range(user_query)
+    meta = {'degraded': degraded, 'timings_ms': timings}
+    if date_range:
+        meta['date_range'] = date_range
+    start = time.perf_counter()
+    try:
+        top_candidates, gallery_images = retrieve_candidates(
+            user_query, clip_vector=clip_vector, deadline=Deadline(RETRIEVAL_DEADLINE_SECONDS), degraded=degraded,
+            date_range=date_range
+        )
+        timings['retrieval'] = round((time.perf_counter() - start) * 1000, 1)
     except Exception as e:
         print(f"CRITICAL ERROR: {e}")
-        return f"Error: {e}", [], []
+        return {'answer': f"Error: {e}", 'sources': [], 'gallery': [], 'meta': meta}
 
-    final_list = list(all_candidates_map.values())
-    
-    if not final_list:
-        return "No articles found.", [], []
-
-    final_list.sort(key=lambda x: str(x.get('date', ''))[:10], reverse=True)
-    
-    top_candidates = final_list[:6]
+    if not top_candidates:
+        if 'text' in degraded and 'images' in degraded:
+            return {'answer': "Error: Search is temporarily unavailable.", 'sources': [], 'gallery': [], 'meta': meta}
+        return {'answer': "No articles found.", 'sources': [], 'gallery': [], 'meta': meta}
 
+    start = time.perf_counter()
     try:
         answer, _ = generation_service.generate_answer_with_ranking(
             user_query, 
-            top_candidates
+            top_candidates,
+            corpus_epoch
         )
-        return answer, top_candidates, gallery_images[:4]
-        
     except Exception as e:
-        return f"Gen Error: {e}", top_candidates, gallery_images[:4]
\ No newline at end of file
+        answer = f"Gen Error: {e}"
+    timings['generation'] = round((time.perf_counter() - start) * 1000, 1)
+
+    return {'answer': answer, 'sources': top_candidates, 'gallery': gallery_images, 'meta': meta}
+
+def get_rag_response(user_query, source='web'):
+    result = run_query(user_query, source=source)
+    return result['answer'], result['sources'], result['gallery']
+
+def run_batch(queries, max_workers=BATCH_MAX_WORKERS):
+    unique_queries = {}
+    for query in queries:
+        unique_queries.setdefault(normalize_query(query), query)
+
+    clip_vectors = [None] * len(unique_queries)
+    try:
+        clip_vectors = list(retrieval_service.encode_clip_texts(list(unique_queries.values())))
+    except Exception as e:
+        print(f"(Orchestrator) Batched CLIP encoding failed, falling back to per-query encoding: {e}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda q, v: run_query(q, v, source='batch'), unique_queries.values(), clip_vectors
+        ))
+
+    results_by_key = dict(zip(unique_queries.keys(), results))
+    return [results_by_key[normalize_query(query)] for query in queries]
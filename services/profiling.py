@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import uuid
+import json
+import time
+import threading
+import tracemalloc
+
+PROFILE_ALLOWLIST = {ip.strip() for ip in os.getenv("PROFILE_ALLOWLIST", "").split(",") if ip.strip()}
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "data/profiles")
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+TOP_ALLOCATIONS = 30
+TRACEMALLOC_FRAMES = 10
+
+# Retrieval calls run on the circuit breakers' executors (thread names "retrieval-<collection>").
+WORKER_THREAD_PREFIXES = ("retrieval-",)
+IDLE_WORKER_FILES = (os.path.join("concurrent", "futures", "thread.py"), "threading.py", "queue.py")
+_REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+_profile_lock = threading.Lock()
+
+
+def request_id(headers):
+    # The ID names files on disk, so anything but a short plain token is replaced by a server-side ID.
+    candidate = headers.get("X-Request-ID") or ""
+    return candidate if _REQUEST_ID.fullmatch(candidate) else uuid.uuid4().hex
+
+
+def should_profile(headers, args, remote_addr):
+    if not PROFILE_ALLOWLIST:
+        return False
+    requested = headers.get("X-Profile") == "1" or args.get("profile") == "1"
+    return requested and remote_addr in PROFILE_ALLOWLIST
+
+
+class _StackSampler:
+    """Samples the request thread and the retrieval executor threads, one speedscope profile per thread.
+
+    Executor threads are shared by all requests, so their samples can include work for other requests
+    that ran at the same time. Idle executor threads (waiting for work) are not recorded.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_SECONDS, worker_prefixes=WORKER_THREAD_PREFIXES):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.worker_prefixes = worker_prefixes
+        self.frames = []
+        self.frame_index = {}
+        self.threads = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _frame_id(self, code, lineno):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self.frame_index.get(key)
+        if index is None:
+            index = len(self.frames)
+            self.frame_index[key] = index
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _watched_threads(self):
+        watched = {self.thread_id: "request"}
+        for thread in threading.enumerate():
+            if thread.name.startswith(self.worker_prefixes):
+                watched[thread.ident] = thread.name
+        return watched
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            current_frames = sys._current_frames()
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            for thread_id, name in self._watched_threads().items():
+                frame = current_frames.get(thread_id)
+                if frame is None:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if thread_id != self.thread_id and all(c.co_filename.endswith(IDLE_WORKER_FILES) for c in codes):
+                    continue
+                stack = [self._frame_id(code, 0) for code in reversed(codes)]
+                samples, weights = self.threads.setdefault(name, ([], []))
+                samples.append(stack)
+                weights.append(weight)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def to_speedscope(self, name):
+        profiles = []
+        for thread_name, (samples, weights) in self.threads.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{name} [{thread_name}]",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "services.profiling",
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+def _allocation_report(snapshot, request_id, elapsed):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    stats = snapshot.statistics("traceback")
+    total = sum(stat.size for stat in stats)
+
+    lines = [
+        f"Request {request_id}: {elapsed:.3f}s, {total / 1024:.1f} KiB still allocated at the end of the request",
+        "tracemalloc is process-wide: allocations by other requests running at the same time are included.",
+        f"Top {TOP_ALLOCATIONS} allocation sites by size:",
+        "",
+    ]
+    for i, stat in enumerate(stats[:TOP_ALLOCATIONS], 1):
+        lines.append(f"#{i}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    return "\n".join(lines) + "\n"
+
+
+def _write_results(request_id, sampler, snapshot, peak, elapsed):
+    profile_path = os.path.join(PROFILE_OUTPUT_DIR, f"{request_id}.speedscope.json")
+    report_path = os.path.join(PROFILE_OUTPUT_DIR, f"{request_id}.allocations.txt")
+    try:
+        with open(profile_path, "w", encoding="utf-8") as f:
+            json.dump(sampler.to_speedscope(request_id), f)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {peak / 1024 / 1024:.2f} MiB\n")
+            f.write(_allocation_report(snapshot, request_id, elapsed))
+    except OSError as e:
+        print(f"(Profiler) Could not write profile for request {request_id}: {e}")
+        return
+    print(f"(Profiler) Request {request_id} profiled in {elapsed:.2f}s -> {profile_path}, {report_path}")
+
+
+def profile_call(request_id, fn, *args, **kwargs):
+    if not _REQUEST_ID.fullmatch(str(request_id)):
+        raise ValueError("request_id must match [A-Za-z0-9_-]{1,64}")
+
+    with _profile_lock:
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        sampler = _StackSampler(threading.get_ident())
+
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _write_results(request_id, sampler, snapshot, peak, elapsed)
@@ -0,0 +1,72 @@
+import re
+from datetime import date, timedelta
+
+MONTHS = {
+    name: i for i, name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"], 1)
+}
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+_RELATIVE_SPAN = re.compile(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?\b")
+_CALENDAR = re.compile(r"\b(this|last|past|previous)\s+(week|month|year)\b")
+_MONTH_YEAR = re.compile(r"\b(" + "|".join(MONTHS) + r")\s+(20\d{2})\b")
+_YEAR = re.compile(r"\b(?:in|from|during|of)\s+(20\d{2})\b")
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+
+def _window(start, end):
+    return {'date_from': start.isoformat(), 'date_to': end.isoformat()}
+
+
+def infer_date_range(user_query, today=None):
+    today = today or date.today()
+    text = user_query.lower()
+
+    match = _RELATIVE_SPAN.search(text)
+    if match:
+        days = int(match.group(1)) * UNIT_DAYS[match.group(2)]
+        return _window(today - timedelta(days=days), today)
+
+    match = _CALENDAR.search(text)
+    if match:
+        which, unit = match.groups()
+        if which == "past":
+            return _window(today - timedelta(days=UNIT_DAYS[unit]), today)
+        current = which == "this"
+        if unit == "week":
+            monday = today - timedelta(days=today.weekday())
+            if current:
+                return _window(monday, today)
+            return _window(monday - timedelta(days=7), monday - timedelta(days=1))
+        if unit == "month":
+            if current:
+                return _window(today.replace(day=1), today)
+            last_day = today.replace(day=1) - timedelta(days=1)
+            return _window(last_day.replace(day=1), last_day)
+        if current:
+            return _window(date(today.year, 1, 1), today)
+        return _window(date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))
+
+    match = _MONTH_YEAR.search(text)
+    if match:
+        return _window(*_month_range(int(match.group(2)), MONTHS[match.group(1)]))
+
+    match = _YEAR.search(text)
+    if match:
+        year = int(match.group(1))
+        return _window(date(year, 1, 1), date(year, 12, 31))
+
+    return {}
+
+
+def in_date_range(value, date_range):
+    if not date_range:
+        return True
+    day = str(value or "")[:10]
+    return date_range['date_from'] <= day <= date_range['date_to']
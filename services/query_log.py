@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+QUERY_LOG_MODE = os.getenv("QUERY_LOG_MODE", "off").lower()
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "data/logs/queries.jsonl")
+QUERY_LOG_SAMPLE_RATE = float(os.getenv("QUERY_LOG_SAMPLE_RATE", 1.0))
+QUERY_LOG_SALT = os.getenv("QUERY_LOG_SALT", "")
+QUERY_LOG_TITLES = os.getenv("QUERY_LOG_TITLES", "1") == "1"
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_LONG_NUMBER = re.compile(r"\d[\d\s().-]{5,}\d")
+# Year ranges and ISO dates carry the date hints query_dates.infer_date_range reads, so they are kept.
+_DATE_LIKE = re.compile(r"\d{4}\s*-\s*\d{4}|\d{4}-\d{2}-\d{2}")
+
+_lock = threading.Lock()
+_fd = None
+_fd_pid = None
+
+
+if QUERY_LOG_MODE == "hashed" and not QUERY_LOG_SALT:
+    # Unsalted hashes of short queries fall to a dictionary attack, so they are no safer than plain text.
+    print("(QueryLog) QUERY_LOG_MODE=hashed needs QUERY_LOG_SALT; query logging is disabled.")
+    QUERY_LOG_MODE = "off"
+
+
+def enabled():
+    return QUERY_LOG_MODE in ("full", "hashed")
+
+
+def _redact_number(match):
+    # Phone numbers have 7-15 digits and card numbers 13-19; anything shorter or date-shaped is kept.
+    number = match.group()
+    digits = sum(c.isdigit() for c in number)
+    if not 7 <= digits <= 19 or _DATE_LIKE.fullmatch(number):
+        return number
+    return "<number>"
+
+
+def redact(text):
+    return _LONG_NUMBER.sub(_redact_number, _EMAIL.sub("<email>", text))
+
+
+def query_hash(normalized_query):
+    return hashlib.sha256((QUERY_LOG_SALT + normalized_query).encode("utf-8")).hexdigest()[:16]
+
+
+def _write(line):
+    global _fd, _fd_pid
+    with _lock:
+        if _fd is None or _fd_pid != os.getpid():
+            os.makedirs(os.path.dirname(QUERY_LOG_PATH) or ".", exist_ok=True)
+            _fd = os.open(QUERY_LOG_PATH, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o640)
+            _fd_pid = os.getpid()
+        # One write() per record on an O_APPEND descriptor keeps lines from different workers intact.
+        os.write(_fd, line)
+
+
+def record(normalized_query, result, cache, total_ms, source=None, epoch=None):
+    if not enabled() or (QUERY_LOG_SAMPLE_RATE < 1.0 and random.random() >= QUERY_LOG_SAMPLE_RATE):
+        return
+
+    meta = result.get('meta', {})
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "t": round(time.time(), 3),
+        "source": source,
+        "cache": cache,
+        "timings_ms": {**meta.get('timings_ms', {}), "total": round(total_ms, 1)},
+        "candidates": [s.get('title') for s in result.get('sources', [])] if QUERY_LOG_TITLES else len(result.get('sources', [])),
+        "degraded": meta.get('degraded') or None,
+        "epoch": epoch,
+    }
+    if QUERY_LOG_MODE == "full":
+        entry["query"] = redact(normalized_query)
+    else:
+        entry["query_hash"] = query_hash(normalized_query)
+
+    try:
+        _write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+    except OSError as e:
+        print(f"(QueryLog) Could not write query log: {e}")
@@ -0,0 +1,24 @@
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        wait_time = slot - now
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def backoff(self, seconds: float):
+        # After a quota error every caller pauses, not only the thread that hit it.
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
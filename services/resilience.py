@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.05
+
+MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", 16))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, max_workers=MAX_WORKERS):
+        self.name = name
+        # Each breaker gets its own pool so a stalled dependency cannot starve calls to a healthy one.
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"retrieval-{name}")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def call_with_resilience(fn, breaker, tracker, deadline=None, hedge=False):
+    # Check the deadline first: allow() hands out the half-open probe, which must end in a success or failure.
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"Deadline expired before querying '{breaker.name}'.")
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit for '{breaker.name}' is open.")
+
+    def timed_call():
+        start = time.monotonic()
+        result = fn()
+        tracker.observe(time.monotonic() - start)
+        return result
+
+    futures = {breaker.executor.submit(timed_call)}
+    hedge_delay = tracker.percentile(95) if hedge else None
+    if hedge_delay is not None:
+        hedge_delay = max(hedge_delay, HEDGE_MIN_DELAY_SECONDS)
+        if deadline is not None:
+            hedge_delay = min(hedge_delay, deadline.remaining())
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            futures.add(breaker.executor.submit(timed_call))
+
+    last_error = None
+    while futures:
+        timeout = deadline.remaining() if deadline is not None else None
+        done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # The caller gives up here; queued calls must not run later and hold pool slots during the slowdown.
+            for future in futures:
+                future.cancel()
+            breaker.record_failure()
+            raise DeadlineExceeded(f"Query to '{breaker.name}' exceeded its deadline.")
+
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            for pending in futures:
+                pending.cancel()
+            breaker.record_success()
+            return result
+
+    breaker.record_failure()
+    raise last_error
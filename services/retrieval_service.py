@@ -1,101 +1,279 @@
+import os
 import weaviate
 from weaviate.connect import ConnectionParams
-import torch
-import clip
 from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.classes.query import GroupBy, MetadataQuery, Filter
+from datetime import date, datetime, timedelta, timezone
 import numpy as np 
+from weaviate.exceptions import WeaviateQueryError, WeaviateUnsupportedFeatureError
+from .resilience import CircuitBreaker, LatencyTracker, CircuitOpenError, call_with_resilience
+
+CLIP_TEXT_ENCODER_PATH = os.getenv("CLIP_TEXT_ENCODER_PATH")
+EMBEDDING_SIDECAR_SOCKET = os.getenv("EMBEDDING_SIDECAR_SOCKET")
 
 try:
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    clip_model, preprocess = clip.load("ViT-B/32", device=device)
-    print(f"(Retriever) CLIP model loaded onto '{device}' for image search.")
+    if EMBEDDING_SIDECAR_SOCKET:
+        from .embedding_sidecar import EmbeddingClient
+        clip_encoder = EmbeddingClient(EMBEDDING_SIDECAR_SOCKET)
+        print(f"(Retriever) Using embedding sidecar at '{EMBEDDING_SIDECAR_SOCKET}' for image search.")
+    else:
+        from . import clip_text_encoder
+        clip_encoder = clip_text_encoder.load_local_encoder(CLIP_TEXT_ENCODER_PATH)
+        print(f"(Retriever) {clip_encoder.description} loaded for image search.")
 except Exception as e:
     print(f"(Retriever) Error loading CLIP model: {e}")
-    clip_model = None
-try:
-    weaviate_client = weaviate.WeaviateClient(
-        connection_params=ConnectionParams.from_params(
-            http_host="localhost",
-            http_port=8080,
-            http_secure=False,
-            grpc_host="localhost",
-            grpc_port=50051,
-            grpc_secure=False,
-        ),
-        additional_config=AdditionalConfig(
-            timeout=Timeout(init=60, query=120, insert=120) 
-        )
+    clip_encoder = None
+DEFER_CONNECT = os.getenv("BATCH_RAG_DEFER_CONNECT") == "1"
+QUERY_TIMEOUT_SECONDS = int(os.getenv("WEAVIATE_QUERY_TIMEOUT", 30))
+HEDGE_QUERIES = os.getenv("RETRIEVAL_HEDGE", "0") == "1"
+
+breakers = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("BREAKER_RESET_SECONDS", 30)),
     )
-    weaviate_client.connect()
-    
-    text_collection = weaviate_client.collections.get("BatchChunk")
-    image_collection = weaviate_client.collections.get("BatchImage")
-    
-    print("(Retriever) Weaviate client connected and collections loaded.")
+    for name in ("BatchChunk", "BatchImage")
+}
+latency_trackers = {name: LatencyTracker() for name in breakers}
 
-except Exception as e:
-    print(f"(Retriever) Error connecting to Weaviate: {e}")
-    text_collection = None
-    image_collection = None
+weaviate_client = None
+text_collection = None
+image_collection = None
+_connected_pid = None
 
+def connect():
+    global weaviate_client, text_collection, image_collection, _connected_pid
+    if _connected_pid == os.getpid():
+        return
 
-def search_text_chunks(query: str, limit: int = 5, alpha: float = 0.7) -> list:
-    if not text_collection:
-        raise ConnectionError("Weaviate 'BatchChunk' collection not available.")
     try:
-        response = text_collection.query.hybrid(
-            query=query,
-            limit=limit,
-            alpha=alpha,
-            return_properties=[
-                "content", "news_title", "issue_date", "issue_url", "image_url"
-            ]
+        weaviate_client = weaviate.WeaviateClient(
+            connection_params=ConnectionParams.from_params(
+                http_host="localhost",
+                http_port=8080,
+                http_secure=False,
+                grpc_host="localhost",
+                grpc_port=50051,
+                grpc_secure=False,
+            ),
+            additional_config=AdditionalConfig(
+                timeout=Timeout(init=60, query=QUERY_TIMEOUT_SECONDS, insert=120) 
+            )
         )
-        return [chunk.properties for chunk in response.objects]
+        weaviate_client.connect()
+        
+        text_collection = weaviate_client.collections.get("BatchChunk")
+        image_collection = weaviate_client.collections.get("BatchImage")
+        _connected_pid = os.getpid()
+        
+        print(f"(Retriever) Weaviate client connected and collections loaded (pid {_connected_pid}).")
+
     except Exception as e:
-        print(f"(Retriever) Text search error: {e}")
-        return []
+        print(f"(Retriever) Error connecting to Weaviate: {e}")
+        text_collection = None
+        image_collection = None
 
-def _get_clip_text_vector(text_query: str) -> np.ndarray:
-    if not clip_model:
+if not DEFER_CONNECT:
+    connect()
+
+
+def _query(collection_name, fn, deadline=None):
+    return call_with_resilience(
+        fn,
+        breakers[collection_name],
+        latency_trackers[collection_name],
+        deadline=deadline,
+        hedge=HEDGE_QUERIES,
+    )
+
+def _as_utc_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    else:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _is_whole_day(value) -> bool:
+    if isinstance(value, datetime):
+        return False
+    return isinstance(value, date) or len(str(value)) == 10
+
+def build_filters(date_from=None, date_to=None, issue_ids=None, issue_property="issue_id",
+                  first_date_property="issue_date", last_date_property="issue_date"):
+    # Objects spanning several dates (shared images) match when [first, last] overlaps the window.
+    conditions = []
+    if date_from:
+        conditions.append(Filter.by_property(last_date_property).greater_or_equal(_as_utc_datetime(date_from)))
+    if date_to:
+        if _is_whole_day(date_to):
+            # A bare date means the whole day, so the bound is the start of the next day.
+            conditions.append(Filter.by_property(first_date_property).less_than(_as_utc_datetime(date_to) + timedelta(days=1)))
+        else:
+            conditions.append(Filter.by_property(first_date_property).less_or_equal(_as_utc_datetime(date_to)))
+    if issue_ids:
+        conditions.append(Filter.by_property(issue_property).contains_any([int(i) for i in issue_ids]))
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else Filter.all_of(conditions)
+
+SCORE_METADATA = MetadataQuery(score=True, explain_score=True)
+
+def _properties(obj) -> dict:
+    props = dict(obj.properties)
+    if isinstance(props.get("issue_date"), datetime):
+        props["issue_date"] = props["issue_date"].isoformat()
+    return props
+
+def _scored(obj) -> dict:
+    return {**_properties(obj), 'score': obj.metadata.score, 'explain_score': obj.metadata.explain_score}
+
+def search_text_chunks(query: str, limit: int = 5, alpha: float = 0.7, deadline=None,
+                       date_from=None, date_to=None, issue_ids=None) -> list:
+    if not text_collection:
+        raise ConnectionError("Weaviate 'BatchChunk' collection not available.")
+
+    filters = build_filters(date_from, date_to, issue_ids)
+    response = _query("BatchChunk", lambda: text_collection.query.hybrid(
+        query=query,
+        limit=limit,
+        alpha=alpha,
+        filters=filters,
+        return_metadata=SCORE_METADATA,
+        return_properties=[
+            "content", "news_title", "issue_date", "issue_url", "image_url"
+        ]
+    ), deadline)
+    return [_scored(chunk) for chunk in response.objects]
+
+def _group_chunks(chunks: list, num_articles: int, chunks_per_article: int) -> list:
+    groups = {}
+    for chunk in sorted(chunks, key=lambda c: c.get('score') or 0.0, reverse=True):
+        title = chunk.get('news_title')
+        if not title:
+            continue
+        group = groups.setdefault(title, {
+            'news_title': title,
+            'score': chunk.get('score') or 0.0,
+            'explain_score': chunk.get('explain_score'),
+            'chunks': [],
+        })
+        if len(group['chunks']) < chunks_per_article:
+            group['chunks'].append(chunk)
+        group['score'] = max(group['score'], chunk.get('score') or 0.0)
+
+    ranked = sorted(groups.values(), key=lambda g: g['score'], reverse=True)
+    return ranked[:num_articles]
+
+# Set to False once the server rejects hybrid group-by, so later searches go straight to local grouping.
+_server_group_by = True
+
+def _group_by_unsupported(error) -> bool:
+    if isinstance(error, WeaviateUnsupportedFeatureError):
+        return True
+    return isinstance(error, WeaviateQueryError) and "group" in str(error).lower()
+
+def _disable_server_group_by(error):
+    global _server_group_by
+    _server_group_by = False
+    print(f"(Retriever) Server does not support grouped hybrid search, grouping locally: {error}")
+
+def search_articles(query: str, num_articles: int = 6, chunks_per_article: int = 2, alpha: float = 0.7,
+                    deadline=None, date_from=None, date_to=None, issue_ids=None) -> list:
+    if not text_collection:
+        raise ConnectionError("Weaviate 'BatchChunk' collection not available.")
+
+    filters = build_filters(date_from, date_to, issue_ids)
+    return_properties = ["content", "news_title", "issue_date", "issue_url", "image_url"]
+    if _server_group_by:
+        try:
+            response = _query("BatchChunk", lambda: text_collection.query.hybrid(
+                query=query,
+                alpha=alpha,
+                filters=filters,
+                group_by=GroupBy(
+                    prop="news_title",
+                    objects_per_group=chunks_per_article,
+                    number_of_groups=num_articles,
+                ),
+                return_metadata=SCORE_METADATA,
+                return_properties=return_properties
+            ), deadline)
+            return _group_chunks([
+                _scored(obj)
+                for group in response.groups.values()
+                for obj in group.objects
+            ], num_articles, chunks_per_article)
+        except Exception as e:
+            # Only a server without hybrid group-by falls back; outages, deadlines and open breakers propagate.
+            if not _group_by_unsupported(e):
+                raise
+            _disable_server_group_by(e)
+
+    response = _query("BatchChunk", lambda: text_collection.query.hybrid(
+        query=query,
+        limit=num_articles * chunks_per_article * 2,
+        alpha=alpha,
+        filters=filters,
+        return_metadata=SCORE_METADATA,
+        return_properties=return_properties
+    ), deadline)
+    chunks = [_scored(obj) for obj in response.objects]
+    return _group_chunks(chunks, num_articles, chunks_per_article)
+
+NEGATIVE_CONCEPTS = ["diagram", "chart", "text", "abstract art", "screenshot"]
+_negative_vector = None
+
+def encode_clip_texts(texts: list) -> np.ndarray:
+    if not clip_encoder:
         raise RuntimeError("CLIP model is not loaded.")
-        
-    with torch.no_grad():
-        text_inputs = clip.tokenize([text_query]).to(device)
-        text_features = clip_model.encode_text(text_inputs)
-        
-    return text_features.cpu().numpy().flatten()
+    return clip_encoder.encode_texts(texts)
+
+def _get_clip_text_vector(text_query: str) -> np.ndarray:
+    return encode_clip_texts([text_query])[0]
+
+def _get_negative_vector() -> np.ndarray:
+    global _negative_vector
+    if _negative_vector is None:
+        _negative_vector = _get_clip_text_vector(" ".join(NEGATIVE_CONCEPTS))
+    return _negative_vector
 
-def search_images_by_text(query: str, limit: int = 3) -> list:
+def search_images_by_text(query: str, limit: int = 3, query_vector: np.ndarray = None, deadline=None,
+                          date_from=None, date_to=None, issue_ids=None) -> list:
     if not image_collection:
         raise ConnectionError("Weaviate 'BatchImage' collection not available.")
-    if not clip_model:
+    if not clip_encoder:
         raise ConnectionError("CLIP model not available.")
+    if breakers["BatchImage"].state == "open":
+        raise CircuitOpenError("Circuit for 'BatchImage' is open.")
 
-    try:
-        positive_vector = _get_clip_text_vector(query)
-        negative_concepts = ["diagram", "chart", "text", "abstract art", "screenshot"]
-        negative_vector = _get_clip_text_vector(" ".join(negative_concepts))
-        
-        final_vector = positive_vector - (0.6 * negative_vector)
-        
-        norm = np.linalg.norm(final_vector)
-        final_vector = final_vector / norm
-        
-        final_vector_list = final_vector.tolist()
-        response = image_collection.query.hybrid(
-            query=query,
-            vector=final_vector_list,
-            limit=limit,
-            alpha=0.7,
-            return_properties=["image_url", "news_title", "issue_url"]
-        )
-        
-        return [img.properties for img in response.objects]
-
-    except Exception as e:
-        print(f"(Retriever) Error while searching for images: {e}")
-        return []
+    positive_vector = query_vector if query_vector is not None else _get_clip_text_vector(query)
+    negative_vector = _get_negative_vector()
+    
+    final_vector = positive_vector - (0.6 * negative_vector)
+    
+    norm = np.linalg.norm(final_vector)
+    final_vector = final_vector / norm
+    
+    final_vector_list = final_vector.tolist()
+    filters = build_filters(date_from, date_to, issue_ids, issue_property="issue_ids",
+                            first_date_property="first_issue_date")
+    response = _query("BatchImage", lambda: image_collection.query.hybrid(
+        query=query,
+        vector=final_vector_list,
+        limit=limit,
+        alpha=0.7,
+        filters=filters,
+        return_metadata=SCORE_METADATA,
+        return_properties=[
+            "image_url", "image_phash", "news_title", "news_titles", "issue_url", "issue_urls", "issue_date"
+        ]
+    ), deadline)
+    
+    return [_scored(img) for img in response.objects]
 
 def close_connection():
     if weaviate_client:
@@ -0,0 +1,7 @@
+import os
+
+os.environ.setdefault("BATCH_RAG_DEFER_CONNECT", "1")
+
+from app import create_app
+
+app = create_app()